@@ -2,19 +2,31 @@
 """
 from streamlit_news_data_lib.duckdb_retrievers import *
 import streamlit as st
-import plotly.express as px
 import polars as pl
 
-from streamlit_news_data_lib.plotly_helpers import *
+from streamlit_news_data_lib.figures import *
+from streamlit_news_data_lib.frame_cache import default_frame_cache
+from streamlit_news_data_lib.near_duplicates import (
+    default_near_duplicate_clusterer,
+    sync_near_duplicate_clusters_in_background,
+)
+from streamlit_news_data_lib.progressive_rendering import ProgressiveChart, render_approximations
+from streamlit_news_data_lib.exports import filter_date_range, render_export_section
+from streamlit_news_data_lib.snapshots import (
+    MARKET_OVERVIEW_PAGE,
+    load_frame_snapshot,
+    snapshot_key,
+    snapshot_or_render,
+)
 
-# wrap functions with caching
+# wrap functions with caching (size bounded, see frame_cache.py)
 get_motherduck_conn = st.cache_resource(get_motherduck_conn)
-get_min_max_article_dates = st.cache_data(get_min_max_article_dates)
-get_publish_count_per_day = st.cache_data(get_publish_count_per_day)
-get_symbol_mentions_per_period = st.cache_data(get_symbol_mentions_per_period)
-get_avg_sentiment_per_day = st.cache_data(get_avg_sentiment_per_day)
-get_sentiment_day_return_pairs = st.cache_data(get_sentiment_day_return_pairs)
-get_most_similar_with_returns = st.cache_data(get_most_similar_with_returns)
+get_min_max_article_dates = default_frame_cache.cached(get_min_max_article_dates)
+get_publish_count_per_day = default_frame_cache.cached(get_publish_count_per_day)
+get_symbol_mentions_per_period = default_frame_cache.cached(get_symbol_mentions_per_period)
+get_avg_sentiment_per_day = default_frame_cache.cached(get_avg_sentiment_per_day)
+get_sentiment_day_return_pairs = default_frame_cache.cached(get_sentiment_day_return_pairs)
+get_most_similar_with_returns = default_frame_cache.cached(get_most_similar_with_returns)
 
 md_conn = get_motherduck_conn()
 
@@ -24,67 +36,78 @@ min_article_date, max_article_date = get_min_max_article_dates(md_conn)
 
 st.write(f"Data range: [{min_article_date}, {max_article_date}]")
 
-publish_count_per_day = get_publish_count_per_day(md_conn)
-st.plotly_chart(
-    px.bar(
-        publish_count_per_day,
-        x='date',
-        y='count',
-        title='Article publish count per day'
-    )
-)
+dedupe = st.toggle('Collapse near-duplicate (syndicated) articles')
+# partially deduplicated results would be cached, all articles are shown until the first clustering finished
+if dedupe and not sync_near_duplicate_clusters_in_background(
+        md_conn, default_near_duplicate_clusterer, get_data_versions(md_conn)['articles']
+):
+    st.info('Near-duplicate articles are being clustered in the background, all articles are shown until then')
+    dedupe = False
+
+
+def market_overview_snapshot_key(view: str, **params):
+    # snapshots are rendered for the default (not deduplicated) views only
+    return None if dedupe else snapshot_key(MARKET_OVERVIEW_PAGE, view, **params)
+
+
+st.plotly_chart(snapshot_or_render(
+    market_overview_snapshot_key('publish_count_per_day'),
+    lambda: build_publish_count_per_day_plot(get_publish_count_per_day(md_conn, dedupe))
+))
 
 period_selection = st.selectbox('Period', ['day', 'week', 'month'])
-step = 10
 offset_selection = st.number_input('Offset (choose different stocks)', value=0, step=1, min_value=0)
-symbol_mentions_per_period = get_symbol_mentions_per_period(
-    md_conn, period_selection, offset_selection * step,
-    limit=step)
-symbol_mentions_per_period_plot = px.bar(
-    symbol_mentions_per_period,
-    x='date_period',
-    y='symbol_count',
-    title=f'Symbol mentions per {period_selection}',
-    color='symbol',
-)
-st.plotly_chart(symbol_mentions_per_period_plot)
-
-avg_sentiment_per_day = get_avg_sentiment_per_day(md_conn)
-avg_sentiment_per_day_plot = px.scatter(
-    avg_sentiment_per_day,
-    x='date',
-    y='avg_val',
-    title='Avg Sentiment Per Day (all stocks)',
-    hover_data={'symbols_count': True},
-    color='avg_method'
-)
-add_horizontal_line(
-    avg_sentiment_per_day_plot,
-    avg_sentiment_per_day['date'].min(),
-    avg_sentiment_per_day['date'].max(),
-    0
-)
+st.plotly_chart(snapshot_or_render(
+    market_overview_snapshot_key('symbol_mentions_per_period', period=period_selection, offset=offset_selection),
+    lambda: build_symbol_mentions_per_period_plot(
+        get_symbol_mentions_per_period(
+            md_conn, period_selection, offset_selection * SYMBOL_MENTIONS_STEP,
+            limit=SYMBOL_MENTIONS_STEP,
+            dedupe=dedupe),
+        period_selection
+    )
+))
 
-st.plotly_chart(avg_sentiment_per_day_plot)
+# heavy charts: placeholders are filled with approximate charts first (on a cold cache), then with the exact ones.
+# the sentiment vs return pairs have no approximation, their cost is the asof joins over all minute bars, which
+# sampling the articles doesn't reduce
+avg_sentiment_per_day_placeholder = st.empty()
+sentiment_day_return_pairs_placeholder = st.empty()
+similarity_range_container = st.container()
+most_similar_with_returns_placeholder = st.empty()
 
-sentiment_day_return_pairs = get_sentiment_day_return_pairs(md_conn)
-sentiment_day_return_pairs_plot = px.scatter(
-    sentiment_day_return_pairs,
-    x='weighted_sentiment',
-    y='position_return',
-    title='Sentiment vs Return'
-)
-add_horizontal_line(
-    sentiment_day_return_pairs_plot,
-    sentiment_day_return_pairs['weighted_sentiment'].min(),
-    sentiment_day_return_pairs['weighted_sentiment'].max(),
-    0
-)
-sentiment_day_return_pairs_plot.update_yaxes(range=[-5, 5])
-st.plotly_chart(sentiment_day_return_pairs_plot)
+avg_sentiment_per_day_snapshot_key = market_overview_snapshot_key('avg_sentiment_per_day')
+sentiment_day_return_pairs_snapshot_key = market_overview_snapshot_key('sentiment_day_return_pairs')
+most_similar_with_returns_snapshot_key = market_overview_snapshot_key('most_similar_with_returns')
+
+render_approximations([
+    ProgressiveChart(
+        get_avg_sentiment_per_day, (md_conn, dedupe),
+        build_avg_sentiment_per_day_plot, avg_sentiment_per_day_placeholder,
+        avg_sentiment_per_day_snapshot_key
+    ),
+    ProgressiveChart(
+        get_most_similar_with_returns, (md_conn, dedupe),
+        build_most_similar_with_returns_plot, most_similar_with_returns_placeholder,
+        most_similar_with_returns_snapshot_key
+    ),
+])
+
+avg_sentiment_per_day_placeholder.plotly_chart(snapshot_or_render(
+    avg_sentiment_per_day_snapshot_key,
+    lambda: build_avg_sentiment_per_day_plot(get_avg_sentiment_per_day(md_conn, dedupe))
+))
 
-most_similar_with_returns = get_most_similar_with_returns(md_conn)
-similarity_range = st.slider(
+sentiment_day_return_pairs_placeholder.plotly_chart(snapshot_or_render(
+    sentiment_day_return_pairs_snapshot_key,
+    lambda: build_sentiment_day_return_pairs_plot(get_sentiment_day_return_pairs(md_conn, dedupe))
+))
+
+# the snapshot is the unfiltered result, the slider filters it like the queried one
+most_similar_with_returns = load_frame_snapshot(most_similar_with_returns_snapshot_key)
+if most_similar_with_returns is None:
+    most_similar_with_returns = get_most_similar_with_returns(md_conn, dedupe)
+similarity_range = similarity_range_container.slider(
     'Select similarity range to filter below plot',
     min_value=float(most_similar_with_returns['similarity'].min()),
     max_value=float(most_similar_with_returns['similarity'].max()),
@@ -96,20 +119,30 @@ most_similar_with_returns_filtered = most_similar_with_returns.filter(
         similarity_range[1]
     )
 )
-most_similar_with_returns_plot = px.scatter(
-    most_similar_with_returns_filtered,
-    x='position_return_first_article',
-    y='position_return_second_article',
-    title='1 day stock % return for paired most similar articles<br>'
-          '<span style="font-size: small;">(same stock, using 256 dim embeddings)</span>',
-    color='similarity',
-    hover_data={
-        'position_return_first_article': ':.2f',
-        'position_return_second_article': ':.2f',
-        'similarity': ':.2f'
-    }
+most_similar_with_returns_placeholder.plotly_chart(
+    build_most_similar_with_returns_plot(most_similar_with_returns_filtered)
+)
+
+sentiment_day_return_pairs_columns = get_sentiment_day_return_pairs_relation(md_conn, dedupe).columns
+
+
+def get_sentiment_day_return_pairs_export_relation(export_conn, start_date, end_date):
+    return filter_date_range(
+        get_sentiment_day_return_pairs_relation(export_conn, dedupe),
+        'publish_time_NY',
+        start_date,
+        end_date
+    )
+
+
+render_export_section(
+    'sentiment_day_return_pairs',
+    'sentiment vs return pairs',
+    md_conn,
+    get_sentiment_day_return_pairs_export_relation,
+    sentiment_day_return_pairs_columns,
+    min_article_date,
+    max_article_date
 )
-most_similar_with_returns_plot.update_xaxes(range=[-1, 1])
-most_similar_with_returns_plot.update_yaxes(range=[-1, 1])
-most_similar_with_returns_plot.update_layout(title_x=0.25)
-st.plotly_chart(most_similar_with_returns_plot)
+
+st.sidebar.caption(default_frame_cache.stats().summary())
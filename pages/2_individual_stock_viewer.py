@@ -1,16 +1,44 @@
+import datetime as dt
+import functools
+
 import streamlit as st
 from streamlit_news_data_lib.duckdb_retrievers import *
 from streamlit_news_data_lib.duckdb_retrievers import SymbolSortOption
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from streamlit_news_data_lib.frame_cache import default_frame_cache
+from streamlit_news_data_lib.near_duplicates import (
+    default_near_duplicate_clusterer,
+    sync_near_duplicate_clusters_in_background,
+)
+
+from streamlit_news_data_lib.figures import *
+from streamlit_news_data_lib.exports import render_export_section
+from streamlit_news_data_lib.paginated_table import render_paginated_table, slice_page
+from streamlit_news_data_lib.live_bars import (
+    LIVE_TAIL_PERIOD_INTERVALS,
+    LiveTail,
+    get_live_bars_directory,
+    get_live_bars_version,
+)
+from streamlit_news_data_lib.snapshots import (
+    INDIVIDUAL_STOCK_VIEWER_PAGE,
+    OHLCV_SNAPSHOT_PAGE,
+    get_symbol_timestamp_range,
+    load_frame_snapshot,
+    snapshot_key,
+    snapshot_or_render,
+)
 
-# wrap functions with caching
+# wrap functions with caching (size bounded, see frame_cache.py)
 get_motherduck_conn = st.cache_resource(get_motherduck_conn)
 
-get_list_of_symbols = st.cache_data(get_list_of_symbols)
-get_publish_freq_per_period_for_symbol = st.cache_data(get_publish_freq_per_period_for_symbol)
-get_avg_sentiment_per_period_for_symbol = st.cache_data(get_avg_sentiment_per_period_for_symbol)
+get_min_max_article_dates = default_frame_cache.cached(get_min_max_article_dates)
+get_list_of_symbols = default_frame_cache.cached(get_list_of_symbols)
+get_publish_freq_per_period_for_symbol = default_frame_cache.cached(get_publish_freq_per_period_for_symbol)
+get_avg_sentiment_per_period_for_symbol = default_frame_cache.cached(get_avg_sentiment_per_period_for_symbol)
+get_ohlcv_row_count = default_frame_cache.cached(get_ohlcv_row_count)
+get_ohlcv_page = default_frame_cache.cached(get_ohlcv_page)
+
+LIVE_TAIL_REFRESH_SECONDS = 5
 
 md_conn = get_motherduck_conn()
 
@@ -31,99 +59,166 @@ list_of_symbols = get_list_of_symbols(
 stock_symbol = st.selectbox('Choose a stock symbol:', list_of_symbols)
 
 period_selection = st.selectbox('Period', [d.name.lower() for d in DuckDatePartSpecifier])
-symbol_freq_per_period = get_publish_freq_per_period_for_symbol(md_conn, period_selection, stock_symbol)
-symbol_freq_per_period_plot = px.bar(
-    symbol_freq_per_period,
-    x='date_period',
-    y='count',
-    title=f'{stock_symbol} publish frequency per {period_selection}',
-)
-st.plotly_chart(symbol_freq_per_period_plot)
 
-symbol_avg_sentiment_per_period = get_avg_sentiment_per_period_for_symbol(
-    md_conn,
-    period_selection,
-    stock_symbol)
-
-fig = make_subplots(
-    rows=3, cols=1,
-    shared_xaxes=True,
-    vertical_spacing=0.1,
-    subplot_titles=(
-        f'{stock_symbol} avg sentiment per {period_selection}',
-        'OHLC'
+dedupe = st.toggle('Collapse near-duplicate (syndicated) articles')
+# partially deduplicated results would be cached, all articles are shown until the first clustering finished
+if dedupe and not sync_near_duplicate_clusters_in_background(
+        md_conn, default_near_duplicate_clusterer, get_data_versions(md_conn)['articles']
+):
+    st.info('Near-duplicate articles are being clustered in the background, all articles are shown until then')
+    dedupe = False
+
+
+# the snapshots and the cached pages of the ohlcv table hold the bars of the minute_ohlc_ny_tz table only
+has_live_bars = get_live_bars_version(stock_symbol) is not None
+
+
+def stock_viewer_snapshot_key(view: str, uses_ohlcv: bool = False):
+    # snapshots are rendered for the default (not deduplicated) views only, and don't follow the live bars store
+    if dedupe or (uses_ohlcv and has_live_bars):
+        return None
+    return snapshot_key(INDIVIDUAL_STOCK_VIEWER_PAGE, view, symbol=stock_symbol, period=period_selection)
+
+
+st.plotly_chart(snapshot_or_render(
+    stock_viewer_snapshot_key('symbol_freq_per_period'),
+    lambda: build_symbol_freq_per_period_plot(
+        get_publish_freq_per_period_for_symbol(md_conn, period_selection, stock_symbol, dedupe),
+        stock_symbol,
+        period_selection
     )
-)
+))
+
+st.plotly_chart(snapshot_or_render(
+    stock_viewer_snapshot_key('symbol_avg_sentiment_per_period'),
+    lambda: build_symbol_avg_sentiment_per_period_plot(
+        get_avg_sentiment_per_period_for_symbol(md_conn, period_selection, stock_symbol, dedupe),
+        stock_symbol,
+        period_selection
+    )
+))
 
-fig.add_trace(go.Scatter(
-    x=symbol_avg_sentiment_per_period['timestamp'],
-    y=symbol_avg_sentiment_per_period['avg_sentiment'],
-    mode='markers',
-    name='avg sentiment',
-), row=1, col=1)
-
-symbol_avg_sentiment_per_period_plot = px.scatter(
-    symbol_avg_sentiment_per_period,
-    x='timestamp',
-    y='avg_sentiment',
-    title=f'{stock_symbol} avg sentiment per {period_selection}',
-    color='avg_method',
-)
-symbol_avg_sentiment_per_period_plot.add_shape(
-    dict(
-        type="line",
-        x0=0,
-        y0=0,
-        x1=1,
-        y1=0,
-        xref='paper',
-        yref='y',
-        line=dict(
-            color="Red",
-            width=3,
-            dash="dashdot"
-        ),
-        opacity=0.5,
+
+def get_ohlcv_timestamp_range():
+    # only queried (cached) when a view is not snapshotted
+    return get_symbol_timestamp_range(md_conn, stock_symbol, period_selection, dedupe)
+
+
+@functools.cache
+def get_ohlcv_table_version():
+    # queried at most once per rerun, only when the ohlcv table is not snapshotted
+    return get_last_table_minute_bar_timestamp(md_conn, stock_symbol)
+
+
+@functools.cache
+def get_symbol_ohlcv_data():
+    # the cached bars of the table, merged with the bars appended to the live bars store after them
+    return get_ohlcv_data(md_conn, stock_symbol, period_selection, *get_ohlcv_timestamp_range())
+
+
+ohlcv_first_page_snapshot = load_frame_snapshot(stock_viewer_snapshot_key('ohlcv_first_page', uses_ohlcv=True))
+ohlcv_row_count_snapshot = load_frame_snapshot(stock_viewer_snapshot_key('ohlcv_row_count', uses_ohlcv=True))
+
+
+def fetch_ohlcv_page(sort_column, descending, offset, limit):
+    if ohlcv_first_page_snapshot is not None and (sort_column, descending, offset, limit) == OHLCV_SNAPSHOT_PAGE:
+        return ohlcv_first_page_snapshot
+
+    # the chart already holds the merged bars, the page is sliced from them
+    if has_live_bars:
+        return slice_page(get_symbol_ohlcv_data(), sort_column, descending, offset, limit, 'timestamp')
+
+    return get_ohlcv_page(
+        md_conn,
+        stock_symbol,
+        period_selection,
+        *get_ohlcv_timestamp_range(),
+        sort_column,
+        descending,
+        offset,
+        limit,
+        get_ohlcv_table_version()
     )
-)
-symbol_avg_sentiment_per_period_plot.update_layout(
-    yaxis=dict(range=[-100, 100])
-)
-st.plotly_chart(symbol_avg_sentiment_per_period_plot)
 
-min_timestamp = symbol_avg_sentiment_per_period['timestamp'].min()
-max_timestamp = symbol_avg_sentiment_per_period['timestamp'].max()
 
-symbol_ohlc = get_ohlcv_data(
-    md_conn,
-    stock_symbol,
-    period_selection,
-    min_timestamp,
-    max_timestamp
-)
+def get_ohlcv_table_row_count():
+    if ohlcv_row_count_snapshot is not None:
+        return ohlcv_row_count_snapshot['row_count'][0]
 
-st.write(symbol_ohlc)
+    if has_live_bars:
+        return len(get_symbol_ohlcv_data())
 
-fig.add_trace(go.Candlestick(
-    x=symbol_ohlc['timestamp'],
-    open=symbol_ohlc['open'],
-    high=symbol_ohlc['high'],
-    low=symbol_ohlc['low'],
-    close=symbol_ohlc['close'],
-    showlegend=False
-), row=2, col=1)
+    return get_ohlcv_row_count(
+        md_conn, stock_symbol, period_selection, *get_ohlcv_timestamp_range(), get_ohlcv_table_version()
+    )
 
-fig.update_layout(
-    xaxis2_rangeslider_visible=False,
-    width=900
-)
 
-fig.add_trace(go.Bar(
-    x=symbol_ohlc['timestamp'],
-    y=symbol_ohlc['volume'],
-    showlegend=False
-), row=3, col=1)
+render_paginated_table('ohlcv', fetch_ohlcv_page, get_ohlcv_table_row_count(), OHLCV_COLUMNS)
 
 st.plotly_chart(
-    fig,
+    snapshot_or_render(
+        stock_viewer_snapshot_key('symbol_ohlc', uses_ohlcv=True),
+        lambda: build_symbol_ohlc_plot(
+            get_avg_sentiment_per_period_for_symbol(md_conn, period_selection, stock_symbol, dedupe),
+            get_symbol_ohlcv_data(),
+            stock_symbol,
+            period_selection
+        )
+    ),
     use_container_width=False)
+
+
+@st.fragment(run_every=LIVE_TAIL_REFRESH_SECONDS)
+def render_live_tail(symbol: str, period: str):
+    """
+    reruns on its own every LIVE_TAIL_REFRESH_SECONDS, querying only the minute bars after the last seen one.
+    """
+    live_tail = st.session_state.get('live_tail')
+
+    if live_tail is None or (live_tail.symbol, live_tail.period) != (symbol, period):
+        latest_minute_bar_timestamp = get_latest_minute_bar_timestamp(md_conn, symbol)
+        if latest_minute_bar_timestamp is None:
+            st.info(f'No minute bars for {symbol}')
+            return
+
+        # starts at the latest trading day
+        live_tail = LiveTail(
+            symbol,
+            period,
+            dt.datetime.combine(latest_minute_bar_timestamp.date() - dt.timedelta(days=1), dt.time.max)
+        )
+        st.session_state['live_tail'] = live_tail
+
+    live_tail.append(get_minute_bars_after(md_conn, symbol, live_tail.last_seen))
+
+    st.plotly_chart(build_live_tail_plot(live_tail.bars, symbol, period), use_container_width=False)
+    st.caption(f'last bar: {live_tail.last_seen}, refreshed every {LIVE_TAIL_REFRESH_SECONDS} seconds')
+
+
+if get_live_bars_directory() is not None and st.toggle('Live tail (intraday)'):
+    render_live_tail(stock_symbol, st.selectbox('Live bar size', list(LIVE_TAIL_PERIOD_INTERVALS)))
+
+min_article_date, max_article_date = get_min_max_article_dates(md_conn)
+render_export_section(
+    'ohlcv_minute_bars',
+    f'{stock_symbol} minute OHLCV history',
+    md_conn,
+    lambda export_conn, start_date, end_date: get_ohlcv_relation(
+        export_conn,
+        stock_symbol,
+        'minute',
+        start_date,
+        end_date + dt.timedelta(days=1)
+    ),
+    OHLCV_COLUMNS,
+    min_article_date,
+    max_article_date,
+    lambda export_conn, start_date, end_date: get_minute_bars_row_count(
+        export_conn,
+        stock_symbol,
+        start_date,
+        end_date + dt.timedelta(days=1)
+    )
+)
+
+st.sidebar.caption(default_frame_cache.stats().summary())
@@ -0,0 +1,68 @@
+"""
+"""
+import numpy as np
+import streamlit as st
+
+from streamlit_news_data_lib.duckdb_retrievers import *
+from streamlit_news_data_lib.correlations import cluster_order
+from streamlit_news_data_lib.figures import *
+from streamlit_news_data_lib.frame_cache import default_frame_cache
+
+# wrap functions with caching (size bounded, see frame_cache.py)
+get_motherduck_conn = st.cache_resource(get_motherduck_conn)
+get_cross_symbol_correlations = default_frame_cache.cached(get_cross_symbol_correlations)
+
+md_conn = get_motherduck_conn()
+
+st.title('Cross Symbol Correlations')
+
+period_selection = st.selectbox('Period', [d.name.lower() for d in DuckDatePartSpecifier])
+top_k = st.number_input('Number of symbols (most articles)', value=50, min_value=2, max_value=1000, step=10)
+max_lag = st.number_input('Max lead-lag (periods)', value=5, min_value=1, max_value=30, step=1)
+
+# the correlations are recomputed only when new data was synced
+data_versions = get_data_versions(md_conn)
+cross_symbol_correlations = get_cross_symbol_correlations(
+    md_conn,
+    period_selection,
+    top_k,
+    max_lag,
+    f"{data_versions['articles']}:{data_versions['ohlc']}"
+)
+symbols = cross_symbol_correlations.symbols
+
+matrix_selection = st.radio(
+    'Correlation of',
+    ['sentiment', 'returns', 'sentiment vs later returns'],
+    horizontal=True
+)
+
+match matrix_selection:
+    case 'sentiment':
+        correlation = cross_symbol_correlations.sentiment
+        title = f'Correlation of weighted sentiment per {period_selection}'
+    case 'returns':
+        correlation = cross_symbol_correlations.returns
+        title = f'Correlation of returns per {period_selection}'
+    case 'sentiment vs later returns':
+        lag = st.slider(f'Lag ({period_selection}s)', min_value=0, max_value=max_lag, value=1)
+        correlation = cross_symbol_correlations.sentiment_return_lead_lag[lag]
+        title = f'Sentiment (rows) vs return {lag} {period_selection}s later (columns)'
+    case _:
+        raise ValueError(f"Invalid correlation matrix: {matrix_selection}")
+
+if np.isnan(correlation).all():
+    st.info(f'Too few {period_selection}s with data of the same symbols to correlate, choose a shorter period')
+    st.stop()
+
+# clustered: strongly correlated symbols are placed next to each other
+order = cluster_order(correlation)
+ordered_symbols = [symbols[i] for i in order]
+st.plotly_chart(
+    build_correlation_heatmap(correlation[np.ix_(order, order)], ordered_symbols, ordered_symbols, title),
+    use_container_width=False
+)
+
+st.plotly_chart(build_lead_lag_profile_plot(cross_symbol_correlations.sentiment_return_lead_lag, period_selection))
+
+st.sidebar.caption(default_frame_cache.stats().summary())
@@ -0,0 +1,205 @@
+"""
+cross-symbol correlations of symbol x period matrices with missing values.
+
+the pairwise complete correlation of every pair of rows (using only the periods where both rows have a value) is
+computed with six matrix products over the value and presence masks, instead of a python loop over pairs. rows are
+processed in blocks, so memory is bounded by block_size x number of rows.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import polars as pl
+
+DEFAULT_MIN_PERIODS = 10
+DEFAULT_BLOCK_SIZE = 256
+
+
+class CrossSymbolCorrelations(NamedTuple):
+    symbols: list[str]
+    # symbol x symbol
+    sentiment: np.ndarray
+    returns: np.ndarray
+    # lag x symbol x symbol, [lag, i, j]: sentiment of symbol i vs return of symbol j lag trading periods later
+    sentiment_return_lead_lag: np.ndarray
+
+
+def pivot_symbol_period(
+        long_df: pl.DataFrame,
+        value_column: str,
+        symbols: list[str],
+        periods: list
+) -> np.ndarray:
+    """
+    :param long_df: frame with the columns symbol, date_period and value_column
+    :return: symbols x periods matrix, nan where a symbol has no value for a period
+    """
+    cells = (
+        long_df
+        .filter(pl.col(value_column).is_not_null())
+        .with_columns(pl.col('symbol').cast(pl.String))
+        .join(pl.DataFrame({'symbol': symbols, 'row': range(len(symbols))}), on='symbol')
+        .join(
+            pl.DataFrame({'date_period': periods, 'column': range(len(periods))}),
+            on='date_period'
+        )
+    )
+
+    matrix = np.full((len(symbols), len(periods)), np.nan)
+    matrix[cells['row'].to_numpy(), cells['column'].to_numpy()] = cells[value_column].to_numpy()
+
+    return matrix
+
+
+def align_to_trading_periods(sentiment_per_period: pl.DataFrame, trading_periods: list) -> pl.DataFrame:
+    """
+    moves the sentiment of non trading periods (e.g. weekends, holidays) to the next trading period, so lags count
+    trading periods. sentiment after the last trading period is dropped.
+    :param sentiment_per_period: frame with the columns symbol, date_period, weighted_sentiment
+    :param trading_periods: sorted
+    :return: frame with the columns symbol, date_period, weighted_sentiment (the mean of the moved periods)
+    """
+    trading_periods = pl.DataFrame({
+        'trading_period': pl.Series(trading_periods, dtype=sentiment_per_period.schema['date_period'])
+    })
+
+    return (
+        sentiment_per_period
+        .sort('date_period')
+        .join_asof(
+            trading_periods,
+            left_on='date_period',
+            right_on='trading_period',
+            strategy='forward'
+        )
+        .filter(pl.col('trading_period').is_not_null())
+        .group_by('symbol', 'trading_period')
+        .agg(pl.col('weighted_sentiment').mean())
+        .rename({'trading_period': 'date_period'})
+    )
+
+
+def _center_rows(values: np.ndarray) -> np.ndarray:
+    present = ~np.isnan(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        row_means = np.nan_to_num(values).sum(axis=1, keepdims=True) / present.sum(axis=1, keepdims=True)
+    return values - row_means
+
+
+def pairwise_complete_correlation(
+        x: np.ndarray,
+        y: np.ndarray | None = None,
+        min_periods: int = DEFAULT_MIN_PERIODS,
+        block_size: int = DEFAULT_BLOCK_SIZE
+) -> np.ndarray:
+    """
+    pearson correlation of every row of x with every row of y, over the columns where both rows are not nan.
+    :param x: n_x x periods
+    :param y: n_y x periods, defaults to x
+    :param min_periods: pairs with fewer common periods are nan
+    :return: n_x x n_y
+    """
+    y = x if y is None else y
+
+    # centering first keeps the sums of squares small, avoiding cancellation in var = sum(x^2) - sum(x)^2 / n
+    x = _center_rows(x)
+    y = _center_rows(y)
+
+    y_present = (~np.isnan(y)).astype(np.float64)
+    y_values = np.nan_to_num(y)
+    y_squares = y_values ** 2
+
+    correlation = np.empty((x.shape[0], y.shape[0]))
+
+    for start in range(0, x.shape[0], block_size):
+        x_block = x[start:start + block_size]
+        x_present = (~np.isnan(x_block)).astype(np.float64)
+        x_values = np.nan_to_num(x_block)
+
+        # sums over the periods where both rows are present
+        n = x_present @ y_present.T
+        sum_x = x_values @ y_present.T
+        sum_y = x_present @ y_values.T
+        sum_xx = (x_values ** 2) @ y_present.T
+        sum_yy = x_present @ y_squares.T
+        sum_xy = x_values @ y_values.T
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = sum_xy - sum_x * sum_y / n
+            variance_x = sum_xx - sum_x ** 2 / n
+            variance_y = sum_yy - sum_y ** 2 / n
+            block_correlation = covariance / np.sqrt(variance_x * variance_y)
+
+        block_correlation[(n < min_periods) | (variance_x <= 0) | (variance_y <= 0)] = np.nan
+        correlation[start:start + block_size] = np.clip(block_correlation, -1, 1)
+
+    return correlation
+
+
+def lead_lag_correlation(
+        leading: np.ndarray,
+        lagging: np.ndarray,
+        max_lag: int,
+        min_periods: int = DEFAULT_MIN_PERIODS
+) -> np.ndarray:
+    """
+    :param leading: symbols x periods
+    :param lagging: symbols x periods, same periods as leading
+    :return: (max_lag + 1) x symbols x symbols, [lag, i, j]: correlation of leading row i with lagging row j
+    shifted lag periods later
+    """
+    n_periods = leading.shape[1]
+
+    return np.stack([
+        pairwise_complete_correlation(leading[:, :max(n_periods - lag, 0)], lagging[:, lag:], min_periods)
+        for lag in range(max_lag + 1)
+    ])
+
+
+def cluster_order(correlation: np.ndarray) -> np.ndarray:
+    """
+    spectral ordering: rows sorted by the fiedler vector of the graph with the correlations as (non negative)
+    edge weights, which places strongly correlated rows next to each other.
+    :param correlation: square, may be asymmetric and contain nan
+    :return: permutation of the rows
+    """
+    if len(correlation) < 3:
+        return np.arange(len(correlation))
+
+    affinity = np.nan_to_num((correlation + correlation.T) / 2).clip(min=0)
+    np.fill_diagonal(affinity, 0)
+
+    laplacian = np.diag(affinity.sum(axis=1)) - affinity
+    _, eigenvectors = np.linalg.eigh(laplacian)
+
+    return np.argsort(eigenvectors[:, 1], kind='stable')
+
+
+def compute_cross_symbol_correlations(
+        sentiment_per_period: pl.DataFrame,
+        returns_per_period: pl.DataFrame,
+        symbols: list[str],
+        max_lag: int,
+        min_periods: int = DEFAULT_MIN_PERIODS
+) -> CrossSymbolCorrelations:
+    """
+    the periods are the trading periods (the periods with returns), see align_to_trading_periods.
+    :param sentiment_per_period: frame with the columns symbol, date_period, weighted_sentiment
+    :param returns_per_period: frame with the columns symbol, date_period, period_return
+    """
+    periods = sorted(set(returns_per_period['date_period']))
+
+    sentiment = pivot_symbol_period(
+        align_to_trading_periods(sentiment_per_period, periods),
+        'weighted_sentiment',
+        symbols,
+        periods
+    )
+    returns = pivot_symbol_period(returns_per_period, 'period_return', symbols, periods)
+
+    return CrossSymbolCorrelations(
+        symbols,
+        pairwise_complete_correlation(sentiment, min_periods=min_periods),
+        pairwise_complete_correlation(returns, min_periods=min_periods),
+        lead_lag_correlation(sentiment, returns, max_lag, min_periods)
+    )
@@ -3,6 +3,15 @@ from os import environ
 
 import duckdb
 import datetime as dt
+import polars as pl
+
+from streamlit_news_data_lib.correlations import compute_cross_symbol_correlations
+from streamlit_news_data_lib.frame_cache import default_frame_cache
+from streamlit_news_data_lib.live_bars import list_live_bar_files, merge_bars, resample_minute_bars
+from streamlit_news_data_lib.near_duplicates import default_near_duplicate_clusterer
+from streamlit_news_data_lib.quantile_sketches import build_sketches, merge_sketches
+
+APPROXIMATE_SAMPLE_SEED = 42
 
 
 class DuckDatePartSpecifier(enum.Enum):
@@ -11,9 +20,102 @@ class DuckDatePartSpecifier(enum.Enum):
     MONTH = enum.auto()
 
 
+# duckdb date_trunc part -> polars truncate interval (both truncate weeks to monday)
+POLARS_PERIOD_INTERVALS = {
+    'day': '1d',
+    'week': '1w',
+    'month': '1mo',
+}
+
+# dictionary encoded in the results: few distinct values, repeated on many rows
+CATEGORICAL_COLUMNS = {'symbol', 'avg_method'}
+
+# kept as 64 bit floats in the results, prices need more than the ~7 significant digits of float32
+FLOAT64_COLUMNS = {'open', 'high', 'low', 'close'}
+
+# always int64: volumes are summed into larger bars downstream (e.g. live_bars.resample_minute_bars), and int32 sums
+# overflow silently. a fixed dtype also keeps frames of different polls concatenable
+INT64_COLUMNS = {'volume'}
+
+
+def _compact_column(column: pl.Series) -> pl.Series:
+    if column.name in CATEGORICAL_COLUMNS and column.dtype == pl.String:
+        return column.cast(pl.Categorical)
+
+    if column.dtype == pl.Float64 and column.name not in FLOAT64_COLUMNS:
+        return column.cast(pl.Float32)
+
+    # counts, and volume sums (decimals with scale 0)
+    if column.dtype.is_integer() or (isinstance(column.dtype, pl.Decimal) and column.dtype.scale == 0):
+        if column.name in INT64_COLUMNS:
+            return column.cast(pl.Int64)
+
+        min_value, max_value = column.min(), column.max()
+        fits_int32 = min_value is None or (min_value >= -2 ** 31 and max_value < 2 ** 31)
+        return column.cast(pl.Int32 if fits_int32 else pl.Int64)
+
+    return column
+
+
+def compact_frame(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    narrows the dtypes of a result before it is cached and plotted: categorical symbols, float32 values (except
+    prices) and int32 counts (int64 if the values don't fit, and always for volumes).
+    """
+    return df.with_columns(_compact_column(df[column]) for column in df.columns)
+
+
+def get_duckdb_config():
+    """
+    resource limits for the duckdb connection, read from the env variables
+    duckdb_memory_limit (e.g. '2GB'), duckdb_threads and duckdb_temp_directory (where larger than memory
+    intermediates spill to). unset variables keep the duckdb defaults.
+    """
+    return {
+        setting: environ[f'duckdb_{setting}']
+        for setting in ['memory_limit', 'threads', 'temp_directory']
+        if environ.get(f'duckdb_{setting}')
+    }
+
+
 def get_motherduck_conn():
+    config = get_duckdb_config()
+
+    # a local database with the same tables, e.g. built by synthetic_data.py, can be used instead of motherduck
+    local_duckdb_path = environ.get('local_duckdb_path')
+    if local_duckdb_path:
+        return duckdb.connect(local_duckdb_path, read_only=True, config=config)
+
     motherduck_token = environ['motherduck_token']
-    return duckdb.connect(f'md:my_db?motherduck_token={motherduck_token}')
+    return duckdb.connect(f'md:my_db?motherduck_token={motherduck_token}', config=config)
+
+
+def get_articles_relation(
+        _md_conn: duckdb.DuckDBPyConnection,
+        dedupe: bool = False,
+        sample_percent: float | None = None
+):
+    """
+    :param dedupe: if true, near-duplicate articles (see near_duplicates.py) are collapsed to the article leading
+    their cluster. articles which were not clustered yet are kept. works on any connection, the duplicates are read
+    from default_near_duplicate_clusterer as a frame.
+    :param sample_percent: if set, only a (repeatable) random sample of the articles is returned,
+    used for fast approximate results
+    :return: relation over llm_feature_extract_date_ny
+    """
+    sample_clause = f"TABLESAMPLE {sample_percent}% (bernoulli, {APPROXIMATE_SAMPLE_SEED})" if sample_percent else ''
+
+    duplicate_ids = default_near_duplicate_clusterer.duplicate_ids() if dedupe else None
+
+    if duplicate_ids is None:
+        return _md_conn.sql(f"SELECT * FROM llm_feature_extract_date_ny {sample_clause}")
+
+    return _md_conn.sql(
+        f"""
+        SELECT *
+        FROM llm_feature_extract_date_ny {sample_clause}
+        WHERE _id NOT IN (SELECT _id FROM duplicate_ids)"""
+    )
 
 
 def get_min_max_article_dates(_md_conn: duckdb.DuckDBPyConnection):
@@ -38,11 +140,13 @@ def get_min_max_article_dates(_md_conn: duckdb.DuckDBPyConnection):
     return min_article_date.date(), max_article_date.date()
 
 
-def get_publish_count_per_day(_md_conn: duckdb.DuckDBPyConnection):
+def get_publish_count_per_day(_md_conn: duckdb.DuckDBPyConnection, dedupe: bool = False):
+    articles = get_articles_relation(_md_conn, dedupe)
+
     en_articles = _md_conn.sql(
         """
         SELECT *
-        FROM llm_feature_extract_date_ny
+        FROM articles
         WHERE article_language = 'en'"""
     )
 
@@ -54,10 +158,18 @@ def get_publish_count_per_day(_md_conn: duckdb.DuckDBPyConnection):
         GROUP BY date
         ORDER BY date"""
 
-    return _md_conn.sql(query).pl()
+    return compact_frame(_md_conn.sql(query).pl())
 
 
-def get_symbol_mentions_per_period(_md_conn: duckdb.DuckDBPyConnection, period: str, offset: int, limit: int = 100):
+def get_symbol_mentions_per_period(
+        _md_conn: duckdb.DuckDBPyConnection,
+        period: str,
+        offset: int,
+        limit: int = 100,
+        dedupe: bool = False
+):
+    articles = get_articles_relation(_md_conn, dedupe)
+
     # excludes symbols with count of 0
 
     data_for_for_en_articles = _md_conn.sql(
@@ -68,7 +180,7 @@ def get_symbol_mentions_per_period(_md_conn: duckdb.DuckDBPyConnection, period:
             .unnest()
             .upper()
             .trim() AS symbol
-        FROM llm_feature_extract_date_ny
+        FROM articles
         WHERE article_language = 'en'"""
     )
 
@@ -99,10 +211,20 @@ def get_symbol_mentions_per_period(_md_conn: duckdb.DuckDBPyConnection, period:
         ORDER BY
             symbol, date_period"""
 
-    return _md_conn.sql(query).pl()
+    return compact_frame(_md_conn.sql(query).pl())
+
 
+def get_daily_sentiment_sketches(
+        _md_conn: duckdb.DuckDBPyConnection,
+        dedupe: bool = False,
+        sample_percent: float | None = None
+):
+    """
+    :return: dataframe with count, sum and a mergeable quantile sketch (see quantile_sketches.py) of the weighted
+    sentiment per (symbol, day). cached, as all sentiment percentiles per period are merged from it.
+    """
+    articles = get_articles_relation(_md_conn, dedupe, sample_percent)
 
-def get_avg_sentiment_per_day(_md_conn: duckdb.DuckDBPyConnection):
     symbols_with_sentiments = _md_conn.sql(
         f"""
         SELECT 
@@ -114,15 +236,14 @@ def get_avg_sentiment_per_day(_md_conn: duckdb.DuckDBPyConnection):
             .list_distinct()[1]
             .upper() 
               AS symbol
-          FROM llm_feature_extract_date_ny"""
+          FROM articles"""
     )
 
     sentiment_weighted = _md_conn.sql(
         """
         SELECT 
           url,
-          publish_time_NY.strftime('%Y-%m-%d') as date,
-          publish_time_NY,
+          date_trunc('day', publish_time_NY) AS day,
           symbol,
           (list_zip(sentiment_score, sentiment_conf)::STRUCT(v1 FLOAT, v2 FLOAT)[])
             .list_transform(x -> x.v1 * x.v2)[1]
@@ -133,34 +254,97 @@ def get_avg_sentiment_per_day(_md_conn: duckdb.DuckDBPyConnection):
           AND weighted_sentiment NOT NULL"""
     )
 
-    sentiment_weighted_by_day = _md_conn.sql(
-        """
+    # sorted once, the values of each (symbol, day) are contiguous and sorted, as build_sketches expects
+    query = """
         SELECT 
-          date,
-          median(weighted_sentiment) as median,
-          mean(weighted_sentiment) as mean,
-          count(*) as symbols_count
+          symbol,
+          day,
+          weighted_sentiment
         FROM sentiment_weighted
-        GROUP BY date
-        ORDER BY date"""
+        ORDER BY symbol, day, weighted_sentiment"""
+
+    sorted_sentiments = _md_conn.sql(query).pl()
+
+    sentiment_by_symbol_day = sorted_sentiments.group_by('symbol', 'day', maintain_order=True).agg(
+        pl.len().cast(pl.Int64).alias('count'),
+        pl.col('weighted_sentiment').cast(pl.Float64).sum().alias('sum')
     )
 
-    query = f"""
-    UNPIVOT sentiment_weighted_by_day
-        ON median, mean
-        INTO 
-            NAME avg_method
-            VALUE avg_val
+    centroid_means, centroid_weights = build_sketches(
+        sentiment_by_symbol_day['count'].to_numpy(),
+        sorted_sentiments['weighted_sentiment'].to_numpy()
+    )
+
+    return sentiment_by_symbol_day.with_columns(centroid_means, centroid_weights)
+
+
+# shared by all period granularities and symbols, pinned as evicting it makes every percentile query a full scan.
+# only the exact sketches of the default (not deduplicated) view are pinned, the sampled approximations and the
+# opt-in deduplicated sketches are evictable like any other result
+get_daily_sentiment_sketches = default_frame_cache.cached(
+    get_daily_sentiment_sketches,
+    pinned=lambda dedupe, sample_percent, **_: sample_percent is None and not dedupe
+)
+
+
+def get_sentiment_percentiles_per_period(
+        _md_conn: duckdb.DuckDBPyConnection,
+        period: str,
+        symbol: str | None = None,
+        percentiles: tuple[float, ...] = (25, 50, 75),
+        dedupe: bool = False,
+        sample_percent: float | None = None
+):
     """
+    :param symbol: if None, percentiles are over all symbols
+    :param percentiles: in [0, 100]
+    :return: dataframe with columns timestamp (period start), count, mean and a column per percentile (e.g. p50)
+    """
+    sketches = get_daily_sentiment_sketches(_md_conn, dedupe, sample_percent)
 
-    return _md_conn.sql(query).pl()
+    if symbol is not None:
+        sketches = sketches.filter(pl.col('symbol') == symbol)
+
+    sketches_by_period = sketches.with_columns(
+        pl.col('day').dt.truncate(POLARS_PERIOD_INTERVALS[period]).alias('timestamp')
+    )
 
+    return merge_sketches(sketches_by_period, ['timestamp'], list(percentiles))
 
-def get_stocks_large_sentiment_change(_md_conn: duckdb.DuckDBPyConnection):
+
+def get_avg_sentiment_per_day(
+        _md_conn: duckdb.DuckDBPyConnection,
+        dedupe: bool = False,
+        sample_percent: float | None = None
+):
+    sentiment_percentiles_by_day = get_sentiment_percentiles_per_period(
+        _md_conn, 'day', None, (25, 50, 75), dedupe, sample_percent
+    )
+
+    return (
+        sentiment_percentiles_by_day
+        .select(
+            pl.col('timestamp').dt.date().alias('date'),
+            pl.col('p50').alias('median'),
+            'mean',
+            pl.col('count').alias('symbols_count'),
+            'p25',
+            'p75'
+        )
+        .unpivot(
+            ['median', 'mean'],
+            index=['date', 'symbols_count', 'p25', 'p75'],
+            variable_name='avg_method',
+            value_name='avg_val'
+        )
+        .pipe(compact_frame)
+    )
+
+
+def get_weighted_sentiment_relation(_md_conn: duckdb.DuckDBPyConnection, period: str = 'day'):
     """
-    :param _md_conn:
-    :return: dataframe of stock symbols with large sentiment variation.
-    the variation metric is scaled by the symbols number of articles as a proportion of the max number of articles for any symbol
+    :return: lazy relation of the weighted sentiment (score x confidence) of each article of a clean symbol,
+    with its publish period (date_period)
     """
     sentiment_with_symbol_relation = _md_conn.sql(
         """
@@ -180,7 +364,7 @@ def get_stocks_large_sentiment_change(_md_conn: duckdb.DuckDBPyConnection):
         f"""
             SELECT 
               url,
-              date_trunc('day', publish_time_NY) AS date_period,
+              date_trunc('{period}', publish_time_NY) AS date_period,
               symbol,
               (list_zip(sentiment_score, sentiment_conf)::STRUCT(v1 FLOAT, v2 FLOAT)[])
                 .list_transform(x -> x.v1 * x.v2)[1]
@@ -191,6 +375,17 @@ def get_stocks_large_sentiment_change(_md_conn: duckdb.DuckDBPyConnection):
               AND weighted_sentiment NOT NULL"""
     )
 
+    return sentiment_weighted
+
+
+def get_stocks_large_sentiment_change(_md_conn: duckdb.DuckDBPyConnection):
+    """
+    :param _md_conn:
+    :return: list of stock symbols, sorted by large sentiment variation.
+    the variation metric is scaled by the symbols number of articles as a proportion of the max number of articles for any symbol
+    """
+    sentiment_weighted = get_weighted_sentiment_relation(_md_conn)
+
     sentiment_std_dev_relation = _md_conn.sql(
         """
         SELECT 
@@ -222,6 +417,8 @@ def get_stocks_large_sentiment_change(_md_conn: duckdb.DuckDBPyConnection):
         sentiment_std_dev_scaled_by_count_relation
         .select('symbol')
         .pl()
+        .to_series()
+        .to_list()
     )
 
 
@@ -284,7 +481,14 @@ def get_list_of_symbols(
             raise ValueError(f"Invalid sort option: {sort_option_str}")
 
 
-def get_publish_freq_per_period_for_symbol(_md_conn: duckdb.DuckDBPyConnection, period, symbol: str):
+def get_publish_freq_per_period_for_symbol(
+        _md_conn: duckdb.DuckDBPyConnection,
+        period,
+        symbol: str,
+        dedupe: bool = False
+):
+    articles = get_articles_relation(_md_conn, dedupe)
+
     en_articles_with_symbols_relation = _md_conn.sql(
         """
         SELECT *,
@@ -293,7 +497,7 @@ def get_publish_freq_per_period_for_symbol(_md_conn: duckdb.DuckDBPyConnection,
             .unnest()
             .upper()
             .trim() AS symbol
-        FROM llm_feature_extract_date_ny
+        FROM articles
         WHERE article_language = 'en'"""
     )
 
@@ -310,62 +514,51 @@ def get_publish_freq_per_period_for_symbol(_md_conn: duckdb.DuckDBPyConnection,
             ORDER BY
                 date_period"""
 
-    return _md_conn.sql(query).pl()
+    return compact_frame(_md_conn.sql(query).pl())
 
 
-def get_avg_sentiment_per_period_for_symbol(_md_conn: duckdb.DuckDBPyConnection, period, symbol: str):
-    sentiment_with_symbol_relation = _md_conn.sql(
-        """
-        SELECT 
-          url,
-          publish_time_NY,
-          (sentiments->'$[*].sentiment_score')::FLOAT[] AS sentiment_score,
-          (sentiments->>'$[*].sentiment_confidence')::FLOAT[] AS sentiment_conf,
-          (financial_event_with_symbols->>'$[*].symbol.symbol')
-            .list_distinct()[1]
-            .upper() 
-              AS symbol
-          FROM llm_feature_extract_date_ny"""
+def get_avg_sentiment_per_period_for_symbol(
+        _md_conn: duckdb.DuckDBPyConnection,
+        period,
+        symbol: str,
+        dedupe: bool = False
+):
+    sentiment_percentiles_by_period = get_sentiment_percentiles_per_period(
+        _md_conn, period, symbol, (25, 50, 75), dedupe
     )
 
-    filtered_by_symbol_relation = _md_conn.sql(
-        f"""
-        SELECT 
-          url,
-          date_trunc('{period}', publish_time_NY) AS date_period,
-          symbol,
-          (list_zip(sentiment_score, sentiment_conf)::STRUCT(v1 FLOAT, v2 FLOAT)[])
-            .list_transform(x -> x.v1 * x.v2)[1]
-              AS weighted_sentiment
-        FROM sentiment_with_symbol_relation
-        WHERE
-          symbol = '{symbol}'
-          AND weighted_sentiment NOT NULL"""
+    return (
+        sentiment_percentiles_by_period
+        .select(
+            'timestamp',
+            pl.col('p50').alias('median'),
+            'mean',
+            'p25',
+            'p75'
+        )
+        .unpivot(
+            ['median', 'mean'],
+            index=['timestamp', 'p25', 'p75'],
+            variable_name='avg_method',
+            value_name='avg_sentiment'
+        )
+        .pipe(compact_frame)
     )
 
-    avgs_by_period_relation = _md_conn.sql(
-        """
-        SELECT 
-          date_period as timestamp,
-          median(weighted_sentiment) as median,
-          mean(weighted_sentiment) as mean
-        FROM filtered_by_symbol_relation
-        GROUP BY date_period
-        ORDER BY date_period"""
-    )
 
-    query = f"""
-    UNPIVOT avgs_by_period_relation
-    ON median, mean
-    INTO 
-        NAME avg_method
-        VALUE avg_sentiment
-    """
+def get_sentiment_day_return_pairs(_md_conn: duckdb.DuckDBPyConnection, dedupe: bool = False):
+    position_with_sentiment_relation = get_sentiment_day_return_pairs_relation(_md_conn, dedupe)
+
+    return compact_frame(position_with_sentiment_relation.select("weighted_sentiment", "position_return").pl())
 
-    return _md_conn.sql(query).pl()
 
+def get_sentiment_day_return_pairs_relation(_md_conn: duckdb.DuckDBPyConnection, dedupe: bool = False):
+    """
+    :return: lazy relation of the weighted sentiment of each article joined with the 1 day return of its
+    symbol after publication (and the prices / timestamps the return is computed from)
+    """
+    articles = get_articles_relation(_md_conn, dedupe)
 
-def get_sentiment_day_return_pairs(_md_conn: duckdb.DuckDBPyConnection):
     sentiment_rel = _md_conn.sql(
         """
         SELECT 
@@ -377,7 +570,7 @@ def get_sentiment_day_return_pairs(_md_conn: duckdb.DuckDBPyConnection):
             .list_distinct()[1]
             .upper() 
               AS symbol
-        FROM llm_feature_extract_date_ny
+        FROM articles
         WHERE sentiments.json_array_length() > 0"""
     )
 
@@ -398,15 +591,25 @@ def get_sentiment_day_return_pairs(_md_conn: duckdb.DuckDBPyConnection):
 
     positions_returns_relation = get_position_returns_relation(_md_conn, weighted_sentiment_rel)
 
+    # explicit projection: a single id column, and the interval in seconds, parquet / csv exports have no interval
     position_with_sentiment_query = _md_conn.sql(
         """
-        SELECT weighted_sentiment_rel.*,
-          positions_returns_relation.* EXCLUDE(symbol, publish_time_NY)
+        SELECT
+          weighted_sentiment_rel.id,
+          weighted_sentiment_rel.publish_time_NY,
+          weighted_sentiment_rel.symbol,
+          weighted_sentiment_rel.weighted_sentiment,
+          positions_returns_relation.first_open_price,
+          positions_returns_relation.first_open_ts,
+          positions_returns_relation.last_close_price,
+          positions_returns_relation.last_close_ts,
+          epoch(positions_returns_relation.time_in_position) AS time_in_position_seconds,
+          positions_returns_relation.position_return
         FROM weighted_sentiment_rel
         JOIN positions_returns_relation USING (id)"""
     )
 
-    return position_with_sentiment_query.select("weighted_sentiment", "position_return").pl()
+    return position_with_sentiment_query
 
 
 def get_position_returns_relation(
@@ -470,7 +673,13 @@ def get_position_returns_relation(
     return position_returns
 
 
-def get_most_similar_with_returns(_md_conn: duckdb.DuckDBPyConnection):
+def get_most_similar_with_returns(
+        _md_conn: duckdb.DuckDBPyConnection,
+        dedupe: bool = False,
+        sample_percent: float | None = None
+):
+    articles = get_articles_relation(_md_conn, dedupe, sample_percent)
+
     embeddings_base = _md_conn.sql(
         """
         SELECT _id,
@@ -479,7 +688,7 @@ def get_most_similar_with_returns(_md_conn: duckdb.DuckDBPyConnection):
           (financial_event_with_symbols->>'$[*].symbol.stock_exchanges[*]').unnest().upper() AS exchange,
           summary_embeddings::FLOAT[256] embeddings,
           summary
-        FROM llm_feature_extract_date_ny"""
+        FROM articles"""
     )
 
     embeddings_joined_symbol = _md_conn.sql(
@@ -594,11 +803,146 @@ def get_most_similar_with_returns(_md_conn: duckdb.DuckDBPyConnection):
         JOIN embeddings_with_returns_second_article_final USING (id, symbol, similarity)"""
     )
 
-    return embeddings_with_returns_both_articles.select(
+    return compact_frame(embeddings_with_returns_both_articles.select(
         'position_return_first_article',
         'position_return_second_article',
         'similarity'
-    ).pl()
+    ).pl())
+
+
+def get_minute_bars_relation(
+        _md_conn: duckdb.DuckDBPyConnection,
+        symbol: str,
+        after: dt.datetime | None = None,
+        include_live_bars: bool = True
+):
+    """
+    minute bars of the minute_ohlc_ny_tz table, followed by the bars appended to the live bars store
+    (see live_bars.py) since the table's last bar of the symbol.
+    :param after: only the bars after this timestamp; only the store files holding such bars are read
+    :param include_live_bars: if false, only the bars of the table
+    :return: lazy relation with the columns of the minute_ohlc_ny_tz table
+    """
+    after_filter = f"AND timestamp_ny > '{after.isoformat()}'" if after else ''
+
+    table_bars = _md_conn.sql(
+        f"""
+        SELECT 
+          symbol,
+          timestamp_ny,
+          open,
+          high,
+          low,
+          close,
+          volume
+        FROM minute_ohlc_ny_tz
+        WHERE 
+          symbol = '{symbol}'
+          {after_filter}"""
+    )
+
+    live_bar_files = list_live_bar_files(symbol, after) if include_live_bars else []
+    if not live_bar_files:
+        return table_bars
+
+    # the bars a bulk sync already brought into the table are skipped
+    live_bars = _md_conn.sql(
+        f"""
+        SELECT 
+          symbol,
+          timestamp_ny,
+          open,
+          high,
+          low,
+          close,
+          volume
+        FROM read_parquet({live_bar_files})
+        WHERE 
+          timestamp_ny > (
+            SELECT coalesce(max(timestamp_ny), '-infinity'::TIMESTAMP)
+            FROM minute_ohlc_ny_tz
+            WHERE symbol = '{symbol}'
+          )
+          {after_filter}"""
+    )
+
+    return table_bars.union(live_bars)
+
+
+def get_latest_minute_bar_timestamp(_md_conn: duckdb.DuckDBPyConnection, symbol: str) -> dt.datetime | None:
+    latest_minute_bar_timestamp, = get_minute_bars_relation(_md_conn, symbol).aggregate(
+        'max(timestamp_ny)'
+    ).fetchone()
+
+    return latest_minute_bar_timestamp
+
+
+def get_minute_bars_after(_md_conn: duckdb.DuckDBPyConnection, symbol: str, after: dt.datetime):
+    """
+    polled by the live tail of the stock viewer, reads only the bars after the last seen one.
+    :return: frame with the columns of the minute_ohlc_ny_tz table, sorted by timestamp_ny
+    """
+    return compact_frame(get_minute_bars_relation(_md_conn, symbol, after).order('timestamp_ny').pl())
+
+
+def get_last_table_minute_bar_timestamp(_md_conn: duckdb.DuckDBPyConnection, symbol: str) -> dt.datetime | None:
+    """
+    the minute_ohlc_ny_tz table only grows by bulk syncs, which move its last bar of the symbol. used as the version
+    of the results resampled from the table.
+    """
+    last_table_minute_bar_timestamp, = _md_conn.sql(
+        f"""
+        SELECT 
+          max(timestamp_ny)
+        FROM minute_ohlc_ny_tz
+        WHERE symbol = '{symbol}'"""
+    ).fetchone()
+
+    return last_table_minute_bar_timestamp
+
+
+def get_table_ohlcv_data(
+        _md_conn: duckdb.DuckDBPyConnection,
+        symbol: str,
+        period: str,
+        start_date: dt.date,
+        end_date: dt.date,
+        last_table_minute_bar_timestamp: dt.datetime | None = None
+):
+    """
+    ohlcv bars resampled from the bars of the minute_ohlc_ny_tz table only.
+    :param end_date: exclusive
+    :param last_table_minute_bar_timestamp: from get_last_table_minute_bar_timestamp, only used as part of the
+    cache key
+    """
+    return compact_frame(
+        get_ohlcv_relation(_md_conn, symbol, period, start_date, end_date, include_live_bars=False).pl()
+    )
+
+
+# the symbol's whole minute history is resampled, kept while the live bars store grows (see get_ohlcv_data)
+get_table_ohlcv_data = default_frame_cache.cached(get_table_ohlcv_data)
+
+
+def get_live_ohlcv_bars(
+        _md_conn: duckdb.DuckDBPyConnection,
+        symbol: str,
+        period: str,
+        start_date: dt.date,
+        end_date: dt.date,
+        last_table_minute_bar_timestamp: dt.datetime | None
+):
+    """
+    ohlcv bars resampled from the minute bars of the live bars store after the table's last bar, only the store
+    files holding them are read.
+    :param end_date: exclusive
+    :return: frame with the columns of get_ohlcv_relation, empty if there are no such bars
+    """
+    live_minute_bars = get_minute_bars_relation(_md_conn, symbol, last_table_minute_bar_timestamp).filter(
+        f"timestamp_ny >= '{start_date.isoformat()}' AND timestamp_ny < '{end_date.isoformat()}'"
+    ).order('timestamp_ny')
+
+    return resample_minute_bars(compact_frame(live_minute_bars.pl()), POLARS_PERIOD_INTERVALS[period])
 
 
 def get_ohlcv_data(
@@ -608,6 +952,35 @@ def get_ohlcv_data(
         start_date: dt.date,
         end_date: dt.date
 ):
+    """
+    ohlcv bars of the table and of the live bars store. the bars resampled from the table are cached until the next
+    bulk sync, the bars appended to the store after them are re-aggregated and merged in on every call.
+    :param end_date: exclusive
+    """
+    last_table_minute_bar_timestamp = get_last_table_minute_bar_timestamp(_md_conn, symbol)
+
+    return merge_bars(
+        get_table_ohlcv_data(_md_conn, symbol, period, start_date, end_date, last_table_minute_bar_timestamp),
+        get_live_ohlcv_bars(_md_conn, symbol, period, start_date, end_date, last_table_minute_bar_timestamp)
+    )
+
+
+def get_ohlcv_relation(
+        _md_conn: duckdb.DuckDBPyConnection,
+        symbol: str,
+        period: str,
+        start_date: dt.date,
+        end_date: dt.date,
+        include_live_bars: bool = True
+):
+    """
+    :param period: duckdb date part, e.g. 'minute' for the raw minute bars, 'day' for daily bars
+    :param end_date: exclusive
+    :param include_live_bars: if false, only the bars of the minute_ohlc_ny_tz table are resampled
+    :return: lazy relation of the ohlcv bars of symbol resampled to period
+    """
+    minute_bars = get_minute_bars_relation(_md_conn, symbol, include_live_bars=include_live_bars)
+
     ohlcv_data = _md_conn.sql(
         f"""
         SELECT 
@@ -617,10 +990,9 @@ def get_ohlcv_data(
           low,
           close,
           volume
-        FROM minute_ohlc_ny_tz
+        FROM minute_bars
         WHERE 
-          symbol = '{symbol}'
-          AND timestamp_ny >= '{start_date.isoformat()}'
+          timestamp_ny >= '{start_date.isoformat()}'
           AND timestamp_ny < '{end_date.isoformat()}'"""
     )
 
@@ -628,17 +1000,249 @@ def get_ohlcv_data(
         f"""
         SELECT 
             date_trunc('{period}', timestamp) AS timestamp,
-            first(open) AS open,
+            first(open ORDER BY timestamp) AS open,
             max(high) AS high,
             min(low) AS low,
-            last(close) AS close,
+            last(close ORDER BY timestamp) AS close,
             sum(volume) AS volume
         FROM ohlcv_data
         GROUP BY date_trunc('{period}', timestamp)
         ORDER BY timestamp"""
     )
 
-    return grouped_by_period.pl()
+    return grouped_by_period
+
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def get_ohlcv_row_count(
+        _md_conn: duckdb.DuckDBPyConnection,
+        symbol: str,
+        period: str,
+        start_date: dt.date,
+        end_date: dt.date,
+        last_table_minute_bar_timestamp: dt.datetime | None = None
+) -> int:
+    """
+    number of rows of get_table_ohlcv_data, counted without resampling the bars (number of distinct periods).
+    :param end_date: exclusive
+    :param last_table_minute_bar_timestamp: from get_last_table_minute_bar_timestamp, only used as part of the
+    cache key
+    """
+    minute_bars = get_minute_bars_relation(_md_conn, symbol, include_live_bars=False)
+
+    row_count, = _md_conn.sql(
+        f"""
+        SELECT
+          count(DISTINCT date_trunc('{period}', timestamp_ny))
+        FROM minute_bars
+        WHERE
+          timestamp_ny >= '{start_date.isoformat()}'
+          AND timestamp_ny < '{end_date.isoformat()}'"""
+    ).fetchone()
+
+    return row_count
+
+
+def get_minute_bars_row_count(
+        _md_conn: duckdb.DuckDBPyConnection,
+        symbol: str,
+        start_date: dt.date,
+        end_date: dt.date
+) -> int:
+    """
+    number of rows of get_ohlcv_relation for the 'minute' period (table and live bars), counted without grouping
+    the bars. not cached, the live bars store grows.
+    :param end_date: exclusive
+    """
+    minute_bars = get_minute_bars_relation(_md_conn, symbol)
+
+    row_count, = _md_conn.sql(
+        f"""
+        SELECT
+          count(DISTINCT date_trunc('minute', timestamp_ny))
+        FROM minute_bars
+        WHERE
+          timestamp_ny >= '{start_date.isoformat()}'
+          AND timestamp_ny < '{end_date.isoformat()}'"""
+    ).fetchone()
+
+    return row_count
+
+
+def get_ohlcv_page(
+        _md_conn: duckdb.DuckDBPyConnection,
+        symbol: str,
+        period: str,
+        start_date: dt.date,
+        end_date: dt.date,
+        sort_column: str = 'timestamp',
+        descending: bool = False,
+        offset: int = 0,
+        limit: int = 100,
+        last_table_minute_bar_timestamp: dt.datetime | None = None
+):
+    """
+    one page of the ohlcv bars of the minute_ohlc_ny_tz table, only the rows of the page are fetched from duckdb.
+    :param end_date: exclusive
+    :param sort_column: one of OHLCV_COLUMNS
+    :param last_table_minute_bar_timestamp: from get_last_table_minute_bar_timestamp, only used as part of the
+    cache key
+    """
+    if sort_column not in OHLCV_COLUMNS:
+        raise ValueError(f"Invalid sort column: {sort_column}")
+
+    ohlcv_data = get_ohlcv_relation(_md_conn, symbol, period, start_date, end_date, include_live_bars=False)
+
+    # timestamp is unique, it breaks ties so rows don't move between pages
+    return compact_frame(_md_conn.sql(
+        f"""
+        SELECT *
+        FROM ohlcv_data
+        ORDER BY {sort_column} {'DESC' if descending else 'ASC'}, timestamp
+        OFFSET {offset}
+        LIMIT {limit}"""
+    ).pl())
+
+
+def get_weighted_sentiment_per_period(_md_conn: duckdb.DuckDBPyConnection, period: str, symbols: list[str]):
+    """
+    :return: dataframe with the mean weighted sentiment per symbol and period (date_period)
+    """
+    sentiment_weighted = get_weighted_sentiment_relation(_md_conn, period)
+
+    query = f"""
+        SELECT 
+          symbol,
+          date_period,
+          avg(weighted_sentiment) AS weighted_sentiment
+        FROM sentiment_weighted
+        WHERE list_contains({symbols}, symbol)
+        GROUP BY symbol, date_period"""
+
+    return compact_frame(_md_conn.sql(query).pl())
+
+
+def get_returns_per_period(_md_conn: duckdb.DuckDBPyConnection, period: str, symbols: list[str]):
+    """
+    :return: dataframe with the return per symbol and period (date_period), from the last close of the previous
+    period to the last close of the period
+    """
+    period_closes = _md_conn.sql(
+        f"""
+        SELECT 
+          symbol,
+          date_trunc('{period}', timestamp_ny) AS date_period,
+          last(close ORDER BY timestamp_ny) AS close
+        FROM minute_ohlc_ny_tz
+        WHERE list_contains({symbols}, symbol)
+        GROUP BY symbol, date_period"""
+    )
+
+    query = """
+        SELECT 
+          symbol,
+          date_period,
+          close / lag(close) OVER (PARTITION BY symbol ORDER BY date_period) - 1 AS period_return
+        FROM period_closes
+        QUALIFY period_return NOT NULL"""
+
+    return compact_frame(_md_conn.sql(query).pl())
+
+
+def get_cross_symbol_correlations(
+        _md_conn: duckdb.DuckDBPyConnection,
+        period: str,
+        top_k: int,
+        max_lag: int,
+        data_version: str
+):
+    """
+    correlations between the top_k symbols by number of articles, of their weighted sentiment and of their returns
+    per period, and lead-lag correlations of sentiment vs later returns (see correlations.py).
+    :param data_version: from get_data_versions, only used as part of the cache key
+    :return: CrossSymbolCorrelations
+    """
+    symbols = get_list_of_symbols(_md_conn, SymbolSortOption.NUMBER_OF_ARTICLES.name)[:top_k]
+
+    return compute_cross_symbol_correlations(
+        get_weighted_sentiment_per_period(_md_conn, period, symbols),
+        get_returns_per_period(_md_conn, period, symbols),
+        symbols,
+        max_lag
+    )
+
+
+def get_data_versions(_md_conn: duckdb.DuckDBPyConnection):
+    """
+    cheap fingerprints of the source tables, which change whenever new data is synced.
+    :return: dict with the keys 'articles' and 'ohlc'
+    """
+    articles_version, = _md_conn.sql(
+        """
+        SELECT 
+          count(*) || '@' || max(publish_time_NY)
+        FROM llm_feature_extract_date_ny"""
+    ).fetchone()
+
+    ohlc_version, = _md_conn.sql(
+        """
+        SELECT 
+          count(*) || '@' || max(timestamp_ny)
+        FROM minute_ohlc_ny_tz"""
+    ).fetchone()
+
+    return {
+        'articles': articles_version,
+        'ohlc': ohlc_version,
+    }
+
+
+def get_symbol_data_versions(_md_conn: duckdb.DuckDBPyConnection):
+    """
+    :return: dataframe with a fingerprint per symbol of its articles (articles_version) and of its
+    minute bars (ohlc_version)
+    """
+    articles_with_symbols_relation = _md_conn.sql(
+        """
+        SELECT 
+          publish_time_NY,
+          (financial_event_with_symbols->>'$[*].symbol.symbol')
+            .list_distinct()
+            .unnest()
+            .upper()
+            .trim() AS symbol
+        FROM llm_feature_extract_date_ny"""
+    )
+
+    articles_versions = _md_conn.sql(
+        """
+        SELECT 
+          symbol,
+          count(*) || '@' || max(publish_time_NY) AS articles_version
+        FROM articles_with_symbols_relation
+        GROUP BY symbol"""
+    )
+
+    ohlc_versions = _md_conn.sql(
+        """
+        SELECT 
+          symbol,
+          count(*) || '@' || max(timestamp_ny) AS ohlc_version
+        FROM minute_ohlc_ny_tz
+        GROUP BY symbol"""
+    )
+
+    query = """
+        SELECT 
+          symbol,
+          coalesce(articles_version, '') AS articles_version,
+          coalesce(ohlc_version, '') AS ohlc_version
+        FROM articles_versions
+        FULL OUTER JOIN ohlc_versions USING (symbol)"""
+
+    return _md_conn.sql(query).pl()
 
 
 def test_md_conn(md_conn: duckdb.DuckDBPyConnection):
@@ -0,0 +1,239 @@
+"""
+streaming export of retriever relations to parquet / csv / arrow ipc files.
+
+results are streamed from duckdb as arrow record batches and written batch by batch, so the memory used by an
+export is bounded by the batch size, not by the size of the result (duckdb itself spills to its temp directory).
+
+a duckdb connection has at most one open streaming result, a query run on the same connection while an export
+streams ends the stream early. exports therefore run on their own connection (a cursor of the shared one).
+"""
+
+import datetime as dt
+import enum
+import tempfile
+import time
+import uuid
+from os import environ, listdir, makedirs, path, remove
+from typing import Callable
+
+import duckdb
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.ipc
+import pyarrow.parquet
+import streamlit as st
+
+DEFAULT_ROWS_PER_BATCH = 100_000
+
+# larger exports are kept on disk only, st.download_button holds the whole file in memory
+MAX_DOWNLOAD_BUTTON_BYTES = int(environ.get('max_download_button_bytes', 200 * 2 ** 20))
+
+# exports are deleted from the export directory after this many hours
+EXPORT_MAX_AGE_HOURS = float(environ.get('export_max_age_hours', 24))
+
+
+class ExportFormat(enum.Enum):
+    PARQUET = 'parquet'
+    CSV = 'csv'
+    ARROW_IPC = 'arrow'
+
+
+def get_export_directory():
+    export_directory = environ.get('export_directory', path.join(tempfile.gettempdir(), 'stock_news_exports'))
+    makedirs(export_directory, exist_ok=True)
+    return export_directory
+
+
+def remove_old_exports(export_directory: str, max_age_hours: float = EXPORT_MAX_AGE_HOURS) -> int:
+    """
+    :return: number of files removed
+    """
+    removed = 0
+    for file_name in listdir(export_directory):
+        file_path = path.join(export_directory, file_name)
+        try:
+            if time.time() - path.getmtime(file_path) > max_age_hours * 3600:
+                remove(file_path)
+                removed += 1
+        # removed by another session in the meantime
+        except FileNotFoundError:
+            continue
+
+    return removed
+
+
+def filter_date_range(
+        relation: duckdb.DuckDBPyRelation,
+        date_column: str,
+        start_date: dt.date,
+        end_date: dt.date
+):
+    """
+    :param end_date: inclusive
+    """
+    return relation.filter(
+        f"{date_column} >= '{start_date.isoformat()}' "
+        f"AND {date_column} < '{(end_date + dt.timedelta(days=1)).isoformat()}'"
+    )
+
+
+def _open_writer(file_path: str, export_format: ExportFormat, schema: pa.Schema):
+    match export_format:
+        case ExportFormat.PARQUET:
+            return pyarrow.parquet.ParquetWriter(file_path, schema, compression='zstd')
+        case ExportFormat.CSV:
+            return pyarrow.csv.CSVWriter(file_path, schema)
+        case ExportFormat.ARROW_IPC:
+            return pyarrow.ipc.new_file(file_path, schema)
+        case _:
+            raise ValueError(f"Invalid export format: {export_format}")
+
+
+def export_relation(
+        relation: duckdb.DuckDBPyRelation,
+        file_path: str,
+        export_format: ExportFormat,
+        columns: list[str] | None = None,
+        rows_per_batch: int = DEFAULT_ROWS_PER_BATCH,
+        progress_callback: Callable[[int, int | None], None] | None = None,
+        total_rows: int | None = None
+) -> int:
+    """
+    :param relation: should be built on a connection no other query runs on during the export, see the module
+    docstring
+    :param columns: subset of the relation's columns to export, all if None
+    :param progress_callback: called with (rows written, total rows) after every batch
+    :param total_rows: number of rows of the relation if it can be counted cheaply (counting the relation itself
+    would run the whole query twice), None if unknown. a lower bound if rows may be appended to the source
+    :return: number of rows written
+    :raises RuntimeError: if fewer than total_rows rows were written (the file is incomplete)
+    """
+    if columns:
+        relation = relation.select(*[duckdb.ColumnExpression(c) for c in columns])
+
+    reader = relation.fetch_arrow_reader(rows_per_batch)
+
+    rows_written = 0
+    with _open_writer(file_path, export_format, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+            rows_written += batch.num_rows
+
+            if progress_callback:
+                progress_callback(rows_written, total_rows)
+
+    if total_rows is not None and rows_written < total_rows:
+        raise RuntimeError(f"Export of {file_path} ended after {rows_written} of {total_rows} rows")
+
+    return rows_written
+
+
+def render_export_section(
+        key: str,
+        name: str,
+        md_conn: duckdb.DuckDBPyConnection,
+        relation_factory: Callable[[duckdb.DuckDBPyConnection, dt.date, dt.date], duckdb.DuckDBPyRelation],
+        columns: list[str],
+        min_date: dt.date,
+        max_date: dt.date,
+        row_count_factory: Callable[[duckdb.DuckDBPyConnection, dt.date, dt.date], int] | None = None
+):
+    """
+    export form: format, columns and date range selection, export progress and a download button.
+    :param key: unique prefix for the widget keys
+    :param md_conn: the export runs on a cursor of this connection, closed after the export
+    :param relation_factory: builds the relation to export on the given connection, for an inclusive date range
+    :param row_count_factory: counts the rows of the relation for an inclusive date range, only for relations
+    which can be counted cheaply. without it, the progress shows the rows written so far only
+    """
+    with st.expander(f'Export {name}'):
+        export_format = ExportFormat[st.selectbox(
+            'Format',
+            [f.name for f in ExportFormat],
+            format_func=lambda x: x.replace('_', ' ').title(),
+            key=f'{key}_format'
+        )]
+        selected_columns = st.multiselect('Columns', columns, default=columns, key=f'{key}_columns')
+        date_range = st.date_input(
+            'Date range',
+            value=(min_date, max_date),
+            min_value=min_date,
+            max_value=max_date,
+            key=f'{key}_date_range'
+        )
+
+        # the date input returns a single date while the range is being picked
+        if st.button('Export', key=f'{key}_export', disabled=len(date_range) != 2 or not selected_columns):
+            export_directory = get_export_directory()
+            remove_old_exports(export_directory)
+
+            # the session's previous export is replaced by the new one
+            previous_file_path = st.session_state.pop(f'{key}_file_path', None)
+            if previous_file_path is not None:
+                try:
+                    remove(previous_file_path)
+                except FileNotFoundError:
+                    pass
+
+            # the uuid keeps exports started in the same second (e.g. by different sessions) apart
+            file_path = path.join(
+                export_directory,
+                f'{key}_{dt.datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}.{export_format.value}'
+            )
+
+            progress_bar = st.progress(0.0, text='exporting')
+
+            def update_progress(rows_written, total_rows):
+                if total_rows is None:
+                    progress_bar.progress(0.0, text=f'exported {rows_written:,} rows')
+                    return
+
+                progress_bar.progress(
+                    min(rows_written / max(total_rows, 1), 1.0),
+                    text=f'exported {rows_written:,} / {total_rows:,} rows'
+                )
+
+            export_conn = md_conn.cursor()
+            try:
+                # counted before the relation is built, rows appended in between can only add to the export
+                total_rows = row_count_factory(export_conn, *date_range) if row_count_factory else None
+
+                rows_written = export_relation(
+                    relation_factory(export_conn, *date_range),
+                    file_path,
+                    export_format,
+                    selected_columns,
+                    progress_callback=update_progress,
+                    total_rows=total_rows
+                )
+            except Exception:
+                # an incomplete export is not offered for download
+                progress_bar.empty()
+                try:
+                    remove(file_path)
+                except FileNotFoundError:
+                    pass
+                raise
+            finally:
+                export_conn.close()
+
+            progress_bar.progress(1.0, text=f'exported {rows_written:,} rows')
+            st.session_state[f'{key}_file_path'] = file_path
+
+        file_path = st.session_state.get(f'{key}_file_path')
+        if file_path is None or not path.exists(file_path):
+            return
+
+        file_size = path.getsize(file_path)
+        if file_size > MAX_DOWNLOAD_BUTTON_BYTES:
+            st.info(f'The export is {file_size / 2 ** 20:,.0f} MB, too large to download through the browser. '
+                    f'It was saved to {file_path}')
+            return
+
+        with open(file_path, 'rb') as f:
+            st.download_button(
+                f'Download {path.basename(file_path)} ({file_size / 2 ** 20:,.1f} MB)',
+                f,
+                file_name=path.basename(file_path),
+                key=f'{key}_download'
+            )
@@ -0,0 +1,286 @@
+"""
+figures of the pages, shared by the pages and the static snapshot renderer (snapshots.py)
+"""
+
+import warnings
+
+import numpy as np
+import plotly.graph_objects as go
+import polars as pl
+from plotly.subplots import make_subplots
+
+from streamlit_news_data_lib.plotly_helpers import (
+    add_horizontal_line,
+    add_percentile_band,
+    column_values,
+    columnar_bar,
+    columnar_scatter
+)
+
+# number of symbols per offset step of the symbol mentions chart
+SYMBOL_MENTIONS_STEP = 10
+
+
+def build_publish_count_per_day_plot(publish_count_per_day: pl.DataFrame):
+    return columnar_bar(
+        publish_count_per_day,
+        x='date',
+        y='count',
+        title='Article publish count per day'
+    )
+
+
+def build_symbol_mentions_per_period_plot(symbol_mentions_per_period: pl.DataFrame, period: str):
+    return columnar_bar(
+        symbol_mentions_per_period,
+        x='date_period',
+        y='symbol_count',
+        title=f'Symbol mentions per {period}',
+        color='symbol',
+    )
+
+
+def build_avg_sentiment_per_day_plot(avg_sentiment_per_day: pl.DataFrame):
+    avg_sentiment_per_day_plot = columnar_scatter(
+        avg_sentiment_per_day,
+        x='date',
+        y='avg_val',
+        title='Avg Sentiment Per Day (all stocks)',
+        hover_columns={'symbols_count': ''},
+        color='avg_method'
+    )
+    median_per_day = avg_sentiment_per_day.filter(pl.col('avg_method') == 'median').sort('date')
+    add_percentile_band(
+        avg_sentiment_per_day_plot,
+        median_per_day['date'],
+        median_per_day['p25'],
+        median_per_day['p75']
+    )
+    add_horizontal_line(
+        avg_sentiment_per_day_plot,
+        avg_sentiment_per_day['date'].min(),
+        avg_sentiment_per_day['date'].max(),
+        0
+    )
+    return avg_sentiment_per_day_plot
+
+
+def build_sentiment_day_return_pairs_plot(sentiment_day_return_pairs: pl.DataFrame):
+    sentiment_day_return_pairs_plot = columnar_scatter(
+        sentiment_day_return_pairs,
+        x='weighted_sentiment',
+        y='position_return',
+        title='Sentiment vs Return'
+    )
+    add_horizontal_line(
+        sentiment_day_return_pairs_plot,
+        sentiment_day_return_pairs['weighted_sentiment'].min(),
+        sentiment_day_return_pairs['weighted_sentiment'].max(),
+        0
+    )
+    sentiment_day_return_pairs_plot.update_yaxes(range=[-5, 5])
+    return sentiment_day_return_pairs_plot
+
+
+def build_most_similar_with_returns_plot(most_similar_with_returns: pl.DataFrame):
+    most_similar_with_returns_plot = columnar_scatter(
+        most_similar_with_returns,
+        x='position_return_first_article',
+        y='position_return_second_article',
+        title='1 day stock % return for paired most similar articles<br>'
+              '<span style="font-size: small;">(same stock, using 256 dim embeddings)</span>',
+        color='similarity',
+        hover_columns={
+            'position_return_first_article': ':.2f',
+            'position_return_second_article': ':.2f',
+            'similarity': ':.2f'
+        }
+    )
+    most_similar_with_returns_plot.update_xaxes(range=[-1, 1])
+    most_similar_with_returns_plot.update_yaxes(range=[-1, 1])
+    most_similar_with_returns_plot.update_layout(title_x=0.25)
+    return most_similar_with_returns_plot
+
+
+def build_symbol_freq_per_period_plot(symbol_freq_per_period: pl.DataFrame, symbol: str, period: str):
+    return columnar_bar(
+        symbol_freq_per_period,
+        x='date_period',
+        y='count',
+        title=f'{symbol} publish frequency per {period}',
+    )
+
+
+def build_symbol_avg_sentiment_per_period_plot(
+        symbol_avg_sentiment_per_period: pl.DataFrame,
+        symbol: str,
+        period: str
+):
+    symbol_avg_sentiment_per_period_plot = columnar_scatter(
+        symbol_avg_sentiment_per_period,
+        x='timestamp',
+        y='avg_sentiment',
+        title=f'{symbol} avg sentiment per {period}',
+        color='avg_method',
+    )
+    symbol_median_sentiment_per_period = symbol_avg_sentiment_per_period.filter(
+        pl.col('avg_method') == 'median'
+    ).sort('timestamp')
+    add_percentile_band(
+        symbol_avg_sentiment_per_period_plot,
+        symbol_median_sentiment_per_period['timestamp'],
+        symbol_median_sentiment_per_period['p25'],
+        symbol_median_sentiment_per_period['p75']
+    )
+    symbol_avg_sentiment_per_period_plot.add_shape(
+        dict(
+            type="line",
+            x0=0,
+            y0=0,
+            x1=1,
+            y1=0,
+            xref='paper',
+            yref='y',
+            line=dict(
+                color="Red",
+                width=3,
+                dash="dashdot"
+            ),
+            opacity=0.5,
+        )
+    )
+    symbol_avg_sentiment_per_period_plot.update_layout(
+        yaxis=dict(range=[-100, 100])
+    )
+    return symbol_avg_sentiment_per_period_plot
+
+
+def build_symbol_ohlc_plot(
+        symbol_avg_sentiment_per_period: pl.DataFrame,
+        symbol_ohlc: pl.DataFrame,
+        symbol: str,
+        period: str
+):
+    fig = make_subplots(
+        rows=3, cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.1,
+        subplot_titles=(
+            f'{symbol} avg sentiment per {period}',
+            'OHLC'
+        )
+    )
+
+    fig.add_trace(go.Scatter(
+        x=column_values(symbol_avg_sentiment_per_period['timestamp']),
+        y=column_values(symbol_avg_sentiment_per_period['avg_sentiment']),
+        mode='markers',
+        name='avg sentiment',
+    ), row=1, col=1)
+
+    fig.add_trace(go.Candlestick(
+        x=column_values(symbol_ohlc['timestamp']),
+        open=column_values(symbol_ohlc['open']),
+        high=column_values(symbol_ohlc['high']),
+        low=column_values(symbol_ohlc['low']),
+        close=column_values(symbol_ohlc['close']),
+        showlegend=False
+    ), row=2, col=1)
+
+    fig.update_layout(
+        xaxis2_rangeslider_visible=False,
+        width=900
+    )
+
+    fig.add_trace(go.Bar(
+        x=column_values(symbol_ohlc['timestamp']),
+        y=column_values(symbol_ohlc['volume']),
+        showlegend=False
+    ), row=3, col=1)
+
+    return fig
+
+
+def build_live_tail_plot(live_bars: pl.DataFrame, symbol: str, period: str):
+    fig = make_subplots(
+        rows=2, cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.1,
+        row_heights=[0.7, 0.3],
+        subplot_titles=(f'{symbol} live {period} bars',)
+    )
+
+    fig.add_trace(go.Candlestick(
+        x=column_values(live_bars['timestamp']),
+        open=column_values(live_bars['open']),
+        high=column_values(live_bars['high']),
+        low=column_values(live_bars['low']),
+        close=column_values(live_bars['close']),
+        showlegend=False
+    ), row=1, col=1)
+
+    fig.add_trace(go.Bar(
+        x=column_values(live_bars['timestamp']),
+        y=column_values(live_bars['volume']),
+        showlegend=False
+    ), row=2, col=1)
+
+    fig.update_layout(
+        xaxis_rangeslider_visible=False,
+        width=900
+    )
+
+    return fig
+
+
+def build_correlation_heatmap(correlation: np.ndarray, row_labels: list[str], column_labels: list[str], title: str):
+    fig = go.Figure(go.Heatmap(
+        z=correlation,
+        x=column_labels,
+        y=row_labels,
+        zmin=-1,
+        zmax=1,
+        colorscale='RdBu',
+        reversescale=True,
+        hovertemplate='%{y} / %{x}: %{z:.2f}<extra></extra>'
+    ))
+    fig.update_layout(
+        title=title,
+        yaxis=dict(autorange='reversed'),
+        width=800,
+        height=800
+    )
+    return fig
+
+
+def build_lead_lag_profile_plot(sentiment_return_lead_lag: np.ndarray, period: str):
+    """
+    :param sentiment_return_lead_lag: lag x symbol x symbol
+    """
+    lags = np.arange(len(sentiment_return_lead_lag))
+    own_symbol = np.diagonal(sentiment_return_lead_lag, axis1=1, axis2=2)
+
+    # lags without any correlation (too few common periods) are nan
+    with warnings.catch_warnings(action='ignore', category=RuntimeWarning):
+        own_symbol_mean = np.nanmean(own_symbol, axis=1)
+        all_pairs_mean = np.nanmean(sentiment_return_lead_lag, axis=(1, 2))
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=lags,
+        y=own_symbol_mean,
+        mode='lines+markers',
+        name='same symbol',
+    ))
+    fig.add_trace(go.Scatter(
+        x=lags,
+        y=all_pairs_mean,
+        mode='lines+markers',
+        name='all symbol pairs',
+    ))
+    fig.update_layout(
+        title=f'Mean correlation of sentiment with the return {period}s later',
+        xaxis_title=f'lag ({period}s)',
+        yaxis_title='correlation'
+    )
+    return fig
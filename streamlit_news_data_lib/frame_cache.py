@@ -0,0 +1,231 @@
+"""
+size bounded result cache for the retrievers.
+
+st.cache_data keeps every variant of every result forever, e.g. one frame per (period, offset) or per symbol.
+FrameCache accounts for the byte size of the cached frames and evicts the least recently used entries once
+the global budget is exceeded. pinned entries (e.g. frames other results are derived from) are never evicted, but
+count towards the budget. they may take up to a fraction of it, values pinned past that are cached unpinned, so the
+pinned entries can't crowd out all other results.
+"""
+
+import functools
+import inspect
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from os import environ
+from typing import Callable
+
+import polars as pl
+
+DEFAULT_MAX_BYTES = 512 * 2 ** 20
+
+DEFAULT_MAX_PINNED_FRACTION = 0.5
+
+
+def estimated_size(value) -> int:
+    if isinstance(value, pl.DataFrame):
+        return value.estimated_size()
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimated_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+@dataclass
+class FrameCacheStats:
+    entries: int
+    size_bytes: int
+    max_bytes: int
+    pinned_bytes: int
+    max_pinned_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    # values cached unpinned as the pinned budget was used up
+    pin_refusals: int
+
+    def summary(self) -> str:
+        return (
+            f'result cache: {self.size_bytes / 2 ** 20:.1f} / {self.max_bytes / 2 ** 20:.0f} MB '
+            f'({self.pinned_bytes / 2 ** 20:.1f} / {self.max_pinned_bytes / 2 ** 20:.0f} MB pinned), '
+            f'{self.entries} entries, {self.hits} hits, {self.misses} misses, {self.evictions} evictions, '
+            f'{self.pin_refusals} pin refusals'
+        )
+
+
+class FrameCache:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, max_pinned_fraction: float = DEFAULT_MAX_PINNED_FRACTION):
+        """
+        :param max_pinned_fraction: of max_bytes, the most the pinned entries may take
+        """
+        self.max_bytes = max_bytes
+        self.max_pinned_bytes = int(max_bytes * max_pinned_fraction)
+
+        self._entries: OrderedDict[tuple, tuple[object, int]] = OrderedDict()
+        self._size_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._pinned_bytes = 0
+        self._pin_refusals = 0
+        self._lock = threading.Lock()
+        # key -> lock held while the value of the key is computed, see cached
+        self._compute_locks: dict[tuple, threading.Lock] = {}
+        self._pinned_keys: set[tuple] = set()
+
+    def get(self, key: tuple):
+        """
+        :raises KeyError: if key is not cached
+        """
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self._misses += 1
+                raise
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: tuple, value, pinned: bool = False):
+        """
+        :param pinned: the entry is never evicted, unless pinning it would exceed the pinned budget
+        """
+        size = estimated_size(value)
+
+        with self._lock:
+            if key in self._entries:
+                replaced_size = self._entries.pop(key)[1]
+                self._size_bytes -= replaced_size
+                if key in self._pinned_keys:
+                    self._pinned_keys.remove(key)
+                    self._pinned_bytes -= replaced_size
+
+            if pinned and self._pinned_bytes + size > self.max_pinned_bytes:
+                pinned = False
+                self._pin_refusals += 1
+
+            # values larger than the whole budget are returned to the caller but never cached
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size)
+            self._size_bytes += size
+            if pinned:
+                self._pinned_keys.add(key)
+                self._pinned_bytes += size
+
+            for evicted_key in list(self._entries):
+                if self._size_bytes <= self.max_bytes:
+                    break
+                if evicted_key in self._pinned_keys:
+                    continue
+
+                _, evicted_size = self._entries.pop(evicted_key)
+                self._size_bytes -= evicted_size
+                self._evictions += 1
+
+    def _get_uncounted(self, key: tuple):
+        """
+        :raises KeyError: if key is not cached
+        """
+        with self._lock:
+            value, _ = self._entries[key]
+            self._entries.move_to_end(key)
+            return value
+
+    def _compute_lock(self, key: tuple) -> threading.Lock:
+        with self._lock:
+            return self._compute_locks.setdefault(key, threading.Lock())
+
+    def _release_compute_lock(self, key: tuple, compute_lock: threading.Lock):
+        with self._lock:
+            if self._compute_locks.get(key) is compute_lock:
+                del self._compute_locks[key]
+
+    def __contains__(self, key: tuple):
+        with self._lock:
+            return key in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pinned_keys.clear()
+            self._size_bytes = 0
+            self._pinned_bytes = 0
+
+    def stats(self) -> FrameCacheStats:
+        with self._lock:
+            return FrameCacheStats(
+                entries=len(self._entries),
+                size_bytes=self._size_bytes,
+                max_bytes=self.max_bytes,
+                pinned_bytes=self._pinned_bytes,
+                max_pinned_bytes=self.max_pinned_bytes,
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                pin_refusals=self._pin_refusals
+            )
+
+    def cached(self, func, pinned: bool | Callable[..., bool] = False):
+        """
+        wraps func to cache its results, keyed by func and its arguments.
+        like st.cache_data, arguments whose name starts with an underscore (e.g. _md_conn) are not part of the key.
+        concurrent misses of the same key compute the value once, the other callers wait for it.
+        :param pinned: the results are never evicted, for the few variants of a frame many results derive from.
+        either a bool for all results, or called with func's arguments (by name) to decide per result
+        """
+        signature = inspect.signature(func)
+        func_key = (func.__module__, func.__qualname__)
+
+        def bind(*args, **kwargs):
+            bound_args = signature.bind(*args, **kwargs)
+            bound_args.apply_defaults()
+            return bound_args.arguments
+
+        def make_key(arguments: dict):
+            return func_key + tuple(
+                (name, value)
+                for name, value in arguments.items()
+                if not name.startswith('_')
+            )
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            arguments = bind(*args, **kwargs)
+            key = make_key(arguments)
+
+            try:
+                return self.get(key)
+            except KeyError:
+                pass
+
+            compute_lock = self._compute_lock(key)
+            with compute_lock:
+                # computed by the caller which held the lock before
+                try:
+                    return self._get_uncounted(key)
+                except KeyError:
+                    pass
+
+                try:
+                    value = func(*args, **kwargs)
+                    self.put(key, value, pinned(**arguments) if callable(pinned) else pinned)
+                finally:
+                    self._release_compute_lock(key, compute_lock)
+
+            return value
+
+        wrapper.is_cached = lambda *args, **kwargs: make_key(bind(*args, **kwargs)) in self
+
+        return wrapper
+
+
+# shared by all sessions of the app process
+default_frame_cache = FrameCache(
+    int(environ.get('frame_cache_max_bytes', DEFAULT_MAX_BYTES)),
+    float(environ.get('frame_cache_max_pinned_fraction', DEFAULT_MAX_PINNED_FRACTION))
+)
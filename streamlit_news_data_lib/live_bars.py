@@ -0,0 +1,296 @@
+"""
+append-only ingestion of minute bars dropped as parquet / csv files, and the live tail of the stock viewer.
+
+the watcher picks up files dropped into an inbox directory (a stand-in for a market data feed) and appends their
+bars to a per-symbol store next to the minute_ohlc_ny_tz table:
+
+    <live_bars_directory>/symbol=<SYMBOL>/<first bar timestamp>_<last bar timestamp>.parquet
+
+each file is sorted by timestamp and starts after the last bar of the previous file of the symbol, so the file
+names alone tell which files hold the bars after a given timestamp. bars at or before the symbol's last stored bar
+are dropped, a re-delivered file doesn't duplicate bars. run it next to the app:
+
+    python -m streamlit_news_data_lib.live_bars --inbox dropped_bars --store live_bars
+
+and set the env variable live_bars_directory to the store for the app to read it.
+"""
+
+import argparse
+import datetime as dt
+import re
+import time
+from dataclasses import dataclass, field
+from os import environ, listdir, makedirs, path, replace
+
+import polars as pl
+
+MINUTE_BAR_SCHEMA = {
+    'symbol': pl.String,
+    'timestamp_ny': pl.Datetime('us'),
+    'open': pl.Float64,
+    'high': pl.Float64,
+    'low': pl.Float64,
+    'close': pl.Float64,
+    'volume': pl.Int64,
+}
+
+FILE_TIMESTAMP_FORMAT = '%Y%m%dT%H%M%S'
+
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9.\-]+$')
+
+# live tail bar size -> polars truncate interval
+LIVE_TAIL_PERIOD_INTERVALS = {
+    'minute': '1m',
+    'hour': '1h',
+}
+
+
+def get_live_bars_directory() -> str | None:
+    return environ.get('live_bars_directory')
+
+
+def _symbol_directory(store_directory: str, symbol: str) -> str:
+    return path.join(store_directory, f'symbol={symbol}')
+
+
+def _parse_file_name(file_name: str) -> tuple[dt.datetime, dt.datetime]:
+    first, last = file_name.removesuffix('.parquet').split('_')
+    return dt.datetime.strptime(first, FILE_TIMESTAMP_FORMAT), dt.datetime.strptime(last, FILE_TIMESTAMP_FORMAT)
+
+
+def list_live_bar_files(
+        symbol: str,
+        after: dt.datetime | None = None,
+        store_directory: str | None = None
+) -> list[str]:
+    """
+    :param after: only the files holding bars after this timestamp
+    :param store_directory: defaults to the env variable live_bars_directory
+    :return: paths sorted by time, empty if there is no store
+    """
+    store_directory = store_directory or get_live_bars_directory()
+    if store_directory is None:
+        return []
+
+    symbol_directory = _symbol_directory(store_directory, symbol)
+    if not path.isdir(symbol_directory):
+        return []
+
+    return [
+        path.join(symbol_directory, file_name)
+        for file_name in sorted(listdir(symbol_directory))
+        if file_name.endswith('.parquet')
+        # file names have second resolution, the timestamp filter of the query drops the extra bars
+        and (after is None or _parse_file_name(file_name)[1] >= after.replace(microsecond=0))
+    ]
+
+
+def get_live_bars_version(symbol: str, store_directory: str | None = None) -> str | None:
+    """
+    the store is append-only, the name of the symbol's last file changes with every append.
+    :return: fingerprint of the symbol's live bars, None if it has none
+    """
+    live_bar_files = list_live_bar_files(symbol, store_directory=store_directory)
+    return path.basename(live_bar_files[-1]) if live_bar_files else None
+
+
+def _last_stored_bar_timestamp(symbol_directory: str) -> dt.datetime | None:
+    file_names = sorted(f for f in listdir(symbol_directory) if f.endswith('.parquet'))
+    return _parse_file_name(file_names[-1])[1] if file_names else None
+
+
+def read_bar_file(file_path: str) -> pl.DataFrame:
+    """
+    :return: the bars of a dropped parquet or csv file, with the columns and types of MINUTE_BAR_SCHEMA
+    """
+    if file_path.endswith('.parquet'):
+        bars = pl.read_parquet(file_path)
+    elif file_path.endswith('.csv'):
+        bars = pl.read_csv(file_path, try_parse_dates=True)
+    else:
+        raise ValueError(f"Invalid bar file type: {file_path}")
+
+    missing_columns = set(MINUTE_BAR_SCHEMA) - set(bars.columns)
+    if missing_columns:
+        raise ValueError(f"Missing columns {sorted(missing_columns)} in {file_path}")
+
+    return bars.select(
+        pl.col(column).cast(dtype)
+        for column, dtype in MINUTE_BAR_SCHEMA.items()
+    ).with_columns(
+        pl.col('symbol').str.strip_chars().str.to_uppercase()
+    )
+
+
+def append_bars(bars: pl.DataFrame, store_directory: str) -> int:
+    """
+    appends the bars to the per-symbol store, one new sorted file per symbol.
+    :return: number of bars appended
+    """
+    # validated before anything is written, a rejected file appends no bars
+    invalid_symbols = [s for s in bars['symbol'].unique().to_list() if s is None or not SYMBOL_PATTERN.match(s)]
+    if invalid_symbols:
+        raise ValueError(f"Invalid symbols: {invalid_symbols}")
+
+    appended = 0
+
+    for (symbol,), symbol_bars in bars.group_by('symbol'):
+        symbol_directory = _symbol_directory(store_directory, symbol)
+        makedirs(symbol_directory, exist_ok=True)
+
+        # file names have second resolution, so are the stored bars
+        symbol_bars = symbol_bars.with_columns(pl.col('timestamp_ny').dt.truncate('1s'))
+
+        last_stored_bar_timestamp = _last_stored_bar_timestamp(symbol_directory)
+        if last_stored_bar_timestamp is not None:
+            symbol_bars = symbol_bars.filter(pl.col('timestamp_ny') > last_stored_bar_timestamp)
+
+        symbol_bars = symbol_bars.sort('timestamp_ny').unique('timestamp_ny', keep='last', maintain_order=True)
+        if symbol_bars.is_empty():
+            continue
+
+        file_path = path.join(
+            symbol_directory,
+            f"{symbol_bars['timestamp_ny'][0]:{FILE_TIMESTAMP_FORMAT}}_"
+            f"{symbol_bars['timestamp_ny'][-1]:{FILE_TIMESTAMP_FORMAT}}.parquet"
+        )
+
+        # written to a temp file and renamed, so the app never reads a partially written file
+        symbol_bars.write_parquet(f'{file_path}.tmp')
+        replace(f'{file_path}.tmp', file_path)
+
+        appended += len(symbol_bars)
+
+    return appended
+
+
+def ingest_inbox(inbox_directory: str, store_directory: str, settle_seconds: float = 1.0) -> int:
+    """
+    ingests the files of the inbox, moving them to inbox/processed, or to inbox/failed if they can't be read.
+    :param settle_seconds: files modified more recently are left for the next run, they may still be written to
+    :return: number of bars appended
+    """
+    processed_directory = path.join(inbox_directory, 'processed')
+    failed_directory = path.join(inbox_directory, 'failed')
+    makedirs(processed_directory, exist_ok=True)
+    makedirs(failed_directory, exist_ok=True)
+
+    file_paths = sorted(
+        (
+            path.join(inbox_directory, file_name)
+            for file_name in listdir(inbox_directory)
+            if file_name.endswith(('.parquet', '.csv'))
+        ),
+        key=path.getmtime
+    )
+
+    appended = 0
+    for file_path in file_paths:
+        if time.time() - path.getmtime(file_path) < settle_seconds:
+            continue
+
+        try:
+            file_appended = append_bars(read_bar_file(file_path), store_directory)
+        except (ValueError, pl.exceptions.PolarsError) as e:
+            print(f'failed to ingest {file_path}: {e}')
+            replace(file_path, path.join(failed_directory, path.basename(file_path)))
+            continue
+
+        print(f'ingested {file_path}: {file_appended} new bars')
+        replace(file_path, path.join(processed_directory, path.basename(file_path)))
+        appended += file_appended
+
+    return appended
+
+
+def resample_minute_bars(minute_bars: pl.DataFrame, interval: str) -> pl.DataFrame:
+    """
+    :param minute_bars: frame with the columns of MINUTE_BAR_SCHEMA, sorted by timestamp_ny
+    :param interval: polars truncate interval of the bars, e.g. '1h'
+    :return: ohlcv bars with the columns of the ohlcv retrievers (timestamp, open, high, low, close, volume)
+    """
+    return (
+        minute_bars
+        .group_by(pl.col('timestamp_ny').dt.truncate(interval).alias('timestamp'), maintain_order=True)
+        .agg(
+            pl.col('open').first(),
+            pl.col('high').max(),
+            pl.col('low').min(),
+            pl.col('close').last(),
+            # a narrower volume dtype would overflow silently when summed
+            pl.col('volume').cast(pl.Int64).sum()
+        )
+    )
+
+
+def merge_bars(bars: pl.DataFrame, new_bars: pl.DataFrame) -> pl.DataFrame:
+    """
+    appends new_bars to bars (both sorted by timestamp, with the columns of the ohlcv retrievers). the first new bar
+    may continue the last, partial period of bars, the two are merged into one bar.
+    """
+    if bars.is_empty():
+        return new_bars
+    if new_bars.is_empty():
+        return bars
+
+    return pl.concat([
+        bars.head(-1),
+        pl.concat([bars.tail(1), new_bars.cast(dict(bars.schema))])
+        .group_by('timestamp', maintain_order=True)
+        .agg(
+            pl.col('open').first(),
+            pl.col('high').max(),
+            pl.col('low').min(),
+            pl.col('close').last(),
+            pl.col('volume').sum()
+        )
+    ])
+
+
+@dataclass
+class LiveTail:
+    """
+    bars of a symbol kept up to date from the minute bars after the last seen one.
+    only the last bar (the current, partial period) is recomputed when new minute bars arrive.
+    """
+    symbol: str
+    period: str
+    last_seen: dt.datetime
+    bars: pl.DataFrame = field(default_factory=pl.DataFrame)
+
+    def append(self, minute_bars: pl.DataFrame) -> bool:
+        """
+        :param minute_bars: the minute bars after last_seen, sorted by timestamp_ny
+        :return: whether there were new bars
+        """
+        if minute_bars.is_empty():
+            return False
+
+        self.bars = merge_bars(
+            self.bars,
+            resample_minute_bars(minute_bars, LIVE_TAIL_PERIOD_INTERVALS[self.period])
+        )
+
+        self.last_seen = minute_bars['timestamp_ny'].max()
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='append minute bars dropped into an inbox directory to the store')
+    parser.add_argument('--inbox', required=True, help='directory the parquet / csv bar files are dropped into')
+    parser.add_argument('--store', default=get_live_bars_directory() or 'live_bars')
+    parser.add_argument('--poll-seconds', type=float, default=2.0)
+    parser.add_argument('--once', action='store_true', help='ingest the files of the inbox and exit')
+    args = parser.parse_args()
+
+    makedirs(args.store, exist_ok=True)
+
+    while True:
+        ingest_inbox(args.inbox, args.store)
+        if args.once:
+            break
+        time.sleep(args.poll_seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,410 @@
+"""
+concurrent-user load test for the streamlit pages.
+
+a real streamlit server (`streamlit run streamlit_app.py`) is started against a local (synthetic) duckdb database,
+and each simulated session is a websocket client of it, like a browser tab: it opens a page, then repeatedly changes
+a random widget and reruns the page, like a user browsing.
+reports rerun latency percentiles, throughput and the server's memory per scenario and concurrency level,
+which is used to find the number of concurrent sessions a replica saturates at.
+
+the clients speak streamlit's websocket protocol (BackMsg rerun requests with the widget states, ForwardMsg deltas
+until script_finished), so the measured process is one server replica with its own script threads, caches and
+connection, the clients share nothing with it. every concurrency level starts a fresh server (cold caches).
+a rerun which fails (an exception shown by the page, a timeout, a dropped connection) is counted as an error and
+the session continues with a new connection.
+
+usage:
+    python -m streamlit_news_data_lib.load_test --sessions 1 4 16 --reruns 20
+"""
+
+import argparse
+import asyncio
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from os import environ, path, sysconf
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import polars as pl
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import WebSocketClientConnection, websocket_connect
+
+from streamlit_news_data_lib.synthetic_data import build_synthetic_database
+
+APP_DIR = Path(__file__).resolve().parents[1]
+APP_SCRIPT = APP_DIR / 'streamlit_app.py'
+
+SERVER_START_TIMEOUT = 60
+
+# element types of the widgets the scenarios interact with
+WIDGET_ELEMENT_TYPES = {'selectbox', 'radio', 'checkbox', 'number_input', 'slider'}
+
+
+def _select_option(widget, rng: random.Random) -> WidgetState:
+    # a selectbox's value is the formatted option
+    state = WidgetState(id=widget.id)
+    state.string_value = rng.choice(widget.options)
+    return state
+
+
+def _select_radio_option(widget, rng: random.Random) -> WidgetState:
+    # a radio's value is the option's index
+    state = WidgetState(id=widget.id)
+    state.int_value = rng.randrange(len(widget.options))
+    return state
+
+
+def _toggle(widget, rng: random.Random) -> WidgetState:
+    state = WidgetState(id=widget.id)
+    state.bool_value = rng.random() < 0.5
+    return state
+
+
+def interact_market_overview(widgets: dict, rng: random.Random) -> WidgetState:
+    """
+    :param widgets: the widgets rendered by the last run, by label
+    :return: new state of the changed widget
+    """
+    interaction = rng.choice(['period', 'offset', 'similarity', 'dedupe'])
+
+    match interaction:
+        case 'period':
+            return _select_option(widgets['Period'], rng)
+        case 'offset':
+            state = WidgetState(id=widgets['Offset (choose different stocks)'].id)
+            state.double_value = rng.randint(0, 3)
+            return state
+        case 'similarity':
+            slider = widgets['Select similarity range to filter below plot']
+            state = WidgetState(id=slider.id)
+            state.double_array_value.data.extend(sorted(rng.uniform(slider.min, slider.max) for _ in range(2)))
+            return state
+        case 'dedupe':
+            return _toggle(widgets['Collapse near-duplicate (syndicated) articles'], rng)
+
+
+def interact_individual_stock_viewer(widgets: dict, rng: random.Random) -> WidgetState:
+    interaction = rng.choice(['sort', 'symbol', 'symbol', 'period', 'dedupe'])
+
+    match interaction:
+        case 'sort':
+            return _select_radio_option(widgets['Sort by:'], rng)
+        case 'symbol':
+            return _select_option(widgets['Choose a stock symbol:'], rng)
+        case 'period':
+            return _select_option(widgets['Period'], rng)
+        case 'dedupe':
+            return _toggle(widgets['Collapse near-duplicate (syndicated) articles'], rng)
+
+
+@dataclass
+class Scenario:
+    name: str
+    # url path of the page, its file name without the number prefix
+    page_name: str
+    interact: Callable[[dict, random.Random], WidgetState]
+
+
+SCENARIOS = [
+    Scenario('market_overview', 'market_overview', interact_market_overview),
+    Scenario('individual_stock_viewer', 'individual_stock_viewer', interact_individual_stock_viewer),
+]
+
+
+def _current_rss_bytes(pid: int) -> int | None:
+    """
+    :return: resident memory of the process, None on platforms without procfs
+    """
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+class _RssSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = _current_rss_bytes(pid)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while self.peak is not None and not self._stop_event.wait(self.interval):
+            rss = _current_rss_bytes(self.pid)
+            # the server exited
+            if rss is None:
+                break
+            self.peak = max(self.peak, rss)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def start_server(database_path: str, port: int) -> subprocess.Popen:
+    """
+    starts `streamlit run` on the app against the local database, and waits until it serves
+    """
+    server = subprocess.Popen(
+        [
+            sys.executable, '-m', 'streamlit', 'run', str(APP_SCRIPT),
+            '--server.headless', 'true',
+            '--server.port', str(port),
+            '--server.fileWatcherType', 'none',
+            '--browser.gatherUsageStats', 'false',
+            '--logger.level', 'error',
+        ],
+        cwd=APP_DIR,
+        env={**environ, 'local_duckdb_path': path.abspath(database_path)},
+        stdout=subprocess.DEVNULL
+    )
+
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit server exited with code {server.returncode}")
+        try:
+            with urllib.request.urlopen(f'http://localhost:{port}/_stcore/health', timeout=1):
+                return server
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+
+    stop_server(server)
+    raise RuntimeError(f"streamlit server did not start within {SERVER_START_TIMEOUT}s")
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def rerun_page(
+        conn: WebSocketClientConnection,
+        page_name: str,
+        widget_states: list[WidgetState]
+) -> tuple[dict, list[str]]:
+    """
+    requests a rerun of the page like the browser does, and reads the page's messages until the run finished.
+    :return: widgets rendered by the run by label, messages of the exceptions the page showed
+    """
+    back_msg = BackMsg()
+    back_msg.rerun_script.page_name = page_name
+    back_msg.rerun_script.widget_states.widgets.extend(widget_states)
+    await conn.write_message(back_msg.SerializeToString(), binary=True)
+
+    widgets = {}
+    exceptions = []
+    while True:
+        data = await conn.read_message()
+        if data is None:
+            raise ConnectionError('the server closed the connection')
+
+        msg = ForwardMsg.FromString(data)
+        match msg.WhichOneof('type'):
+            case 'delta' if msg.delta.WhichOneof('type') == 'new_element':
+                element_type = msg.delta.new_element.WhichOneof('type')
+                if element_type == 'exception':
+                    exceptions.append(msg.delta.new_element.exception.message)
+                elif element_type in WIDGET_ELEMENT_TYPES:
+                    widget = getattr(msg.delta.new_element, element_type)
+                    widgets[widget.label] = widget
+            case 'session_event' if msg.session_event.HasField('script_compilation_exception'):
+                exceptions.append(msg.session_event.script_compilation_exception.message)
+            case 'script_finished':
+                return widgets, exceptions
+
+
+async def run_session(
+        base_url: str,
+        scenario: Scenario,
+        reruns: int,
+        seed: int,
+        timeout: float,
+        start_barrier: asyncio.Barrier | None = None
+) -> tuple[list[float], list[str], float, float]:
+    """
+    :param start_barrier: shared by the sessions of a run, so they start interacting at the same time, after all
+    sessions connected
+    :return: rerun latencies in seconds (the initial page load included, failed reruns excluded), messages of the
+    failed reruns, wall clock start and end of the reruns
+    """
+    rng = random.Random(seed)
+    latencies = []
+    errors = []
+
+    conn = await websocket_connect(f'{base_url}/_stcore/stream', subprotocols=['streamlit'])
+
+    if start_barrier is not None:
+        await start_barrier.wait()
+    session_start = time.time()
+
+    # the browser sends the state of every widget of the page with each rerun
+    widget_states: dict[str, WidgetState] = {}
+    widgets = {}
+
+    for rerun in range(reruns + 1):
+        try:
+            if rerun > 0 and widgets:
+                new_state = scenario.interact(widgets, rng)
+                widget_states[new_state.id] = new_state
+
+            # widgets which were not rendered by the last run (e.g. their options changed) have a new id
+            rendered_ids = {widget.id for widget in widgets.values()}
+
+            start = time.perf_counter()
+            widgets, exceptions = await asyncio.wait_for(
+                rerun_page(conn, scenario.page_name, [s for s in widget_states.values() if s.id in rendered_ids]),
+                timeout
+            )
+            latencies.append(time.perf_counter() - start)
+            errors.extend(exceptions)
+        except Exception as e:
+            errors.append(f'{type(e).__name__}: {e}' if str(e) else type(e).__name__)
+            # start over with a new session, the old one may still be running the page or be missing widgets
+            conn.close()
+            widget_states = {}
+            widgets = {}
+            try:
+                conn = await websocket_connect(f'{base_url}/_stcore/stream', subprotocols=['streamlit'])
+            except Exception as connect_error:
+                errors.append(f'{type(connect_error).__name__}: {connect_error}')
+                break
+
+    conn.close()
+
+    return latencies, errors, session_start, time.time()
+
+
+async def run_sessions(base_url: str, scenario: Scenario, sessions: int, reruns: int, seed: int, timeout: float):
+    start_barrier = asyncio.Barrier(sessions)
+    return await asyncio.gather(*[
+        run_session(base_url, scenario, reruns, session_seed, timeout, start_barrier)
+        for session_seed in range(seed, seed + sessions)
+    ])
+
+
+def run_scenario(
+        database_path: str,
+        scenario: Scenario,
+        sessions: int,
+        reruns: int,
+        seed: int,
+        timeout: float
+) -> dict:
+    port = _free_port()
+    # every concurrency level starts cold, like a freshly started replica
+    server = start_server(database_path, port)
+
+    try:
+        baseline_rss = _current_rss_bytes(server.pid)
+        rss_sampler = _RssSampler(server.pid)
+        rss_sampler.start()
+
+        results = asyncio.run(run_sessions(f'ws://localhost:{port}', scenario, sessions, reruns, seed, timeout))
+
+        peak_rss = rss_sampler.stop()
+    finally:
+        stop_server(server)
+
+    # from the barrier (all sessions connected) to the last session's end
+    duration = max(end for *_, end in results) - min(start for *_, start, _ in results)
+
+    latencies = np.array([latency for session_latencies, *_ in results for latency in session_latencies])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (np.nan,) * 3
+
+    def mb(n_bytes):
+        return round(n_bytes / 2 ** 20, 1) if n_bytes is not None else None
+
+    return {
+        'scenario': scenario.name,
+        'sessions': sessions,
+        'reruns': len(latencies),
+        'errors': sum(len(errors) for _, errors, *_ in results),
+        'error_messages': '; '.join(sorted({message for _, errors, *_ in results for message in errors})),
+        'p50_ms': round(p50 * 1000, 1),
+        'p95_ms': round(p95 * 1000, 1),
+        'p99_ms': round(p99 * 1000, 1),
+        'throughput_per_s': round(len(latencies) / duration, 1),
+        # of the server process; None without procfs
+        'baseline_rss_mb': mb(baseline_rss),
+        'peak_rss_mb': mb(peak_rss),
+        'peak_rss_per_session_mb': mb((peak_rss - baseline_rss) / sessions) if peak_rss is not None else None,
+    }
+
+
+def run_load_test(
+        database_path: str,
+        sessions_levels: list[int],
+        reruns: int,
+        scenario_names: list[str] | None = None,
+        seed: int = 0,
+        timeout: float = 120
+) -> pl.DataFrame:
+    if not path.exists(database_path):
+        build_synthetic_database(database_path)
+
+    scenarios = [s for s in SCENARIOS if scenario_names is None or s.name in scenario_names]
+
+    results = []
+    for scenario in scenarios:
+        for sessions in sessions_levels:
+            results.append(run_scenario(database_path, scenario, sessions, reruns, seed, timeout))
+            print(results[-1])
+
+    return pl.DataFrame(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='concurrent-user load test for the streamlit pages')
+    parser.add_argument('--database', default='synthetic_stock_news.duckdb',
+                        help='local duckdb database; a synthetic one is built if the file does not exist')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='concurrency levels (number of simultaneous sessions) to run each scenario at')
+    parser.add_argument('--reruns', type=int, default=10, help='widget interactions per session')
+    parser.add_argument('--scenarios', nargs='+', choices=[s.name for s in SCENARIOS])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120, help='max seconds per rerun')
+    parser.add_argument('--output', help='write the report to this csv file')
+    args = parser.parse_args()
+
+    report = run_load_test(
+        args.database,
+        args.sessions,
+        args.reruns,
+        args.scenarios,
+        args.seed,
+        args.timeout
+    )
+
+    with pl.Config(tbl_rows=-1, tbl_cols=-1, tbl_width_chars=200, fmt_str_lengths=80):
+        print(report)
+
+    if args.output:
+        report.write_csv(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""
+near-duplicate article detection over summary embeddings.
+
+syndicated stories show up many times in the data set with (almost) the same summary.
+articles are hashed with random-hyperplane LSH (SimHash): the sign bits of the embedding projected onto random
+hyperplanes are split into bands, and articles sharing any band land in the same bucket.
+only articles sharing a bucket are compared (cosine similarity), so the work grows roughly linearly with the
+number of articles instead of pairwise.
+
+cluster ids are assigned incrementally: an article joins the cluster of its most similar already clustered
+article, otherwise it starts a new cluster whose id is the article's own id. only the embeddings of the articles
+still held by a bucket are kept, older articles can never be candidates again.
+
+the cluster assignments are kept in memory by the clusterer, the deduplicated queries read the ids of the
+duplicates as a registered frame, so any connection (e.g. an export cursor) can use them. the pages sync the clusters
+in a background thread on its own cursor, whenever the articles' data version changed (the first sync clusters the
+whole corpus), and show all articles until the first sync finished.
+"""
+
+import threading
+from collections import defaultdict, deque
+
+import duckdb
+import numpy as np
+import polars as pl
+
+EMBEDDING_DIM = 256
+
+# articles read per batch of a sync, bounds the embeddings held in memory at once
+SYNC_BATCH_SIZE = 50_000
+
+# initial number of embedding slots of a clusterer, doubled when full
+INITIAL_EMBEDDING_CAPACITY = 1024
+
+
+class NearDuplicateClusterer:
+    def __init__(
+            self,
+            similarity_threshold: float = 0.95,
+            n_bands: int = 16,
+            rows_per_band: int = 8,
+            max_bucket_size: int = 64,
+            embedding_dim: int = EMBEDDING_DIM,
+            seed: int = 0
+    ):
+        """
+        :param similarity_threshold: min cosine similarity for two articles to be considered near-duplicates
+        :param n_bands: number of LSH bands; more bands -> higher recall
+        :param rows_per_band: hyperplane bits per band; more rows -> fewer, more precise candidates
+        :param max_bucket_size: only the most recent articles of a bucket are kept as candidates,
+        which bounds the verification work per article
+        """
+        self.similarity_threshold = similarity_threshold
+        self.n_bands = n_bands
+        self.rows_per_band = rows_per_band
+        self.max_bucket_size = max_bucket_size
+
+        rng = np.random.default_rng(seed)
+        self._hyperplanes = rng.standard_normal((embedding_dim, n_bands * rows_per_band)).astype(np.float32)
+        self._bit_weights = 1 << np.arange(rows_per_band, dtype=np.int64)
+
+        self._buckets: dict[tuple[int, int], deque[int]] = defaultdict(lambda: deque(maxlen=max_bucket_size))
+        self._ids: list = []
+        self._cluster_ids: list = []
+        self._index: dict = {}
+        # ids of the articles which joined the cluster of another article
+        self._duplicate_ids: list = []
+        # rebuilt after every add and replaced as a whole, read without the lock while a sync runs
+        self._duplicate_ids_frame: pl.DataFrame | None = None
+
+        # embeddings of the articles held by a bucket, in slots which are reused once an article left all its buckets
+        self._embeddings = np.empty((0, embedding_dim), dtype=np.float32)
+        self._free_slots: list[int] = []
+        # article idx -> its slot in _embeddings, and the number of buckets holding it
+        self._slots: dict[int, int] = {}
+        self._bucket_refs: dict[int, int] = {}
+
+        # the clusterer is shared by all sessions. reentrant, so sync_near_duplicate_clusters can hold it across its
+        # query and adds
+        self.lock = threading.RLock()
+
+        # background sync, see sync_near_duplicate_clusters_in_background
+        self.sync_thread: threading.Thread | None = None
+        self.sync_thread_lock = threading.Lock()
+        # data version the last sync was started for
+        self.sync_data_version: str | None = None
+        self.initial_sync_done = threading.Event()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def duplicate_ids(self) -> pl.DataFrame | None:
+        """
+        :return: frame with the _id of every clustered article which is not the leader of its cluster,
+        None if there are none
+        """
+        return self._duplicate_ids_frame
+
+    def clustered_ids(self) -> pl.DataFrame | None:
+        """
+        :return: frame with the _id of every clustered article, None if there are none
+        """
+        with self.lock:
+            return pl.DataFrame({'_id': self._ids}) if self._ids else None
+
+    def _store_embedding(self, idx: int, embedding: np.ndarray):
+        if not self._free_slots:
+            # doubled, so the copies amortize to a constant per article
+            capacity = len(self._embeddings)
+            new_capacity = max(2 * capacity, INITIAL_EMBEDDING_CAPACITY)
+            embeddings = np.empty((new_capacity, self._embeddings.shape[1]), dtype=np.float32)
+            embeddings[:capacity] = self._embeddings
+            self._embeddings = embeddings
+            self._free_slots.extend(range(new_capacity - 1, capacity - 1, -1))
+
+        slot = self._free_slots.pop()
+        self._embeddings[slot] = embedding
+        self._slots[idx] = slot
+
+    def _release_bucket_ref(self, idx: int):
+        self._bucket_refs[idx] -= 1
+        if self._bucket_refs[idx] == 0:
+            del self._bucket_refs[idx]
+            self._free_slots.append(self._slots.pop(idx))
+
+    def _band_keys(self, embeddings: np.ndarray) -> np.ndarray:
+        bits = (embeddings @ self._hyperplanes) > 0
+        bits = bits.reshape(len(embeddings), self.n_bands, self.rows_per_band)
+        return bits @ self._bit_weights
+
+    def add(self, ids: list, embeddings: np.ndarray) -> list:
+        """
+        assigns a cluster id to each new article. articles should be added in publish order so that the
+        earliest article of a story leads its cluster.
+        :return: cluster id per article in ids (already clustered articles keep their cluster id)
+        """
+        with self.lock:
+            return self._add(ids, embeddings)
+
+    def _add(self, ids: list, embeddings: np.ndarray) -> list:
+        new_rows = [row for row, article_id in enumerate(ids) if article_id not in self._index]
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)[new_rows]
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
+
+        start_idx = len(self._ids)
+
+        for offset, (row, embedding, keys) in enumerate(zip(new_rows, embeddings, self._band_keys(embeddings))):
+            idx = start_idx + offset
+            buckets = [self._buckets[(band, int(key))] for band, key in enumerate(keys)]
+
+            cluster_id = ids[row]
+            candidates = list({c for bucket in buckets for c in bucket})
+            if candidates:
+                similarities = self._embeddings[[self._slots[c] for c in candidates]] @ embedding
+                best = similarities.argmax()
+                if similarities[best] >= self.similarity_threshold:
+                    cluster_id = self._cluster_ids[candidates[best]]
+
+            self._index[ids[row]] = idx
+            self._ids.append(ids[row])
+            self._cluster_ids.append(cluster_id)
+            if cluster_id != ids[row]:
+                self._duplicate_ids.append(ids[row])
+
+            self._store_embedding(idx, embedding)
+            for bucket in buckets:
+                # the oldest article of a full bucket is dropped from it
+                if len(bucket) == bucket.maxlen:
+                    self._release_bucket_ref(bucket[0])
+                bucket.append(idx)
+            self._bucket_refs[idx] = len(buckets)
+
+        if self._duplicate_ids:
+            self._duplicate_ids_frame = pl.DataFrame({'_id': self._duplicate_ids})
+
+        return [self._cluster_ids[self._index[article_id]] for article_id in ids]
+
+
+# shared by all sessions of the app process
+default_near_duplicate_clusterer = NearDuplicateClusterer()
+
+
+def sync_near_duplicate_clusters(
+        _md_conn: duckdb.DuckDBPyConnection,
+        clusterer: NearDuplicateClusterer,
+        batch_size: int = SYNC_BATCH_SIZE
+):
+    """
+    clusters the articles which have not been clustered yet, streamed batch_size articles at a time.
+    :param _md_conn: no other thread may use it during the sync, e.g. a cursor of the app's connection
+    :return: number of newly clustered articles
+    """
+    # concurrent syncs would otherwise both see the same articles as new
+    with clusterer.lock:
+        clustered_ids = clusterer.clustered_ids()
+        not_clustered_filter = 'AND _id NOT IN (SELECT _id FROM clustered_ids)' if clustered_ids is not None else ''
+
+        new_articles = _md_conn.sql(
+            f"""
+            SELECT
+              _id,
+              summary_embeddings::FLOAT[{EMBEDDING_DIM}] AS embeddings
+            FROM llm_feature_extract_date_ny
+            WHERE
+              summary_embeddings NOT NULL
+              {not_clustered_filter}
+            ORDER BY publish_time_NY, _id"""
+        )
+
+        synced = 0
+        for batch in new_articles.fetch_arrow_reader(batch_size):
+            batch = pl.from_arrow(batch)
+            clusterer.add(batch['_id'].to_list(), batch['embeddings'].to_numpy())
+            synced += len(batch)
+
+        return synced
+
+
+def sync_near_duplicate_clusters_in_background(
+        _md_conn: duckdb.DuckDBPyConnection,
+        clusterer: NearDuplicateClusterer,
+        data_version: str
+) -> bool:
+    """
+    starts a sync in a background thread, on a cursor of _md_conn, if the data version changed since the last sync
+    was started and no sync is running. a rerun doesn't wait for the clustering.
+    :param data_version: fingerprint of the articles, e.g. from get_data_versions
+    :return: whether a sync finished before, until then the clusters are incomplete
+    """
+    with clusterer.sync_thread_lock:
+        sync_running = clusterer.sync_thread is not None and clusterer.sync_thread.is_alive()
+
+        if not sync_running and clusterer.sync_data_version != data_version:
+            clusterer.sync_data_version = data_version
+            clusterer.sync_thread = threading.Thread(
+                target=_background_sync,
+                args=(_md_conn.cursor(), clusterer),
+                daemon=True
+            )
+            clusterer.sync_thread.start()
+
+    return clusterer.initial_sync_done.is_set()
+
+
+def _background_sync(sync_conn: duckdb.DuckDBPyConnection, clusterer: NearDuplicateClusterer):
+    try:
+        sync_near_duplicate_clusters(sync_conn, clusterer)
+        clusterer.initial_sync_done.set()
+    except Exception:
+        # retried by the next rerun
+        with clusterer.sync_thread_lock:
+            clusterer.sync_data_version = None
+        raise
+    finally:
+        sync_conn.close()
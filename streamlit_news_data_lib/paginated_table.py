@@ -0,0 +1,77 @@
+"""
+server paginated, sortable table.
+
+only the rows of the visible page are queried and sent to the browser, so the payload of a page does not grow with
+the number of rows of the table. the total row count is queried separately (and cached by the caller), it doesn't
+change when paging or sorting.
+"""
+
+import math
+from typing import Callable
+
+import polars as pl
+import streamlit as st
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+# fits a page of the default size, st.dataframe only renders the visible rows of larger pages
+TABLE_HEIGHT = 400
+
+
+def slice_page(
+        df: pl.DataFrame,
+        sort_column: str,
+        descending: bool,
+        offset: int,
+        limit: int,
+        tie_break_column: str
+) -> pl.DataFrame:
+    """
+    fetch_page of render_paginated_table for a frame already in memory.
+    :param tie_break_column: unique column, so rows don't move between pages
+    """
+    return df.sort([sort_column, tie_break_column], descending=[descending, False]).slice(offset, limit)
+
+
+def render_paginated_table(
+        key: str,
+        fetch_page: Callable[[str, bool, int, int], pl.DataFrame],
+        row_count: int,
+        columns: list[str],
+        default_sort_column: str | None = None
+):
+    """
+    sort, page size and page number selection, and the table of the selected page.
+    :param key: unique prefix for the widget keys
+    :param fetch_page: called with (sort column, descending, offset, limit), returns the rows of the page
+    :param row_count: total number of rows
+    """
+    sort_column_col, descending_col, page_size_col, page_col = st.columns([3, 2, 2, 2], vertical_alignment='bottom')
+
+    sort_column = sort_column_col.selectbox(
+        'Sort by',
+        columns,
+        index=columns.index(default_sort_column) if default_sort_column else 0,
+        key=f'{key}_sort_column'
+    )
+    descending = descending_col.toggle('Descending', key=f'{key}_descending')
+    page_size = page_size_col.selectbox('Rows per page', PAGE_SIZES, key=f'{key}_page_size')
+
+    page_count = max(math.ceil(row_count / page_size), 1)
+    # the selected page is out of range after the row count shrank or the page size grew
+    if st.session_state.get(f'{key}_page', 1) > page_count:
+        st.session_state[f'{key}_page'] = page_count
+
+    page = page_col.number_input(
+        f'Page (of {page_count:,})',
+        min_value=1,
+        max_value=page_count,
+        step=1,
+        key=f'{key}_page'
+    )
+
+    offset = (page - 1) * page_size
+    page_rows = fetch_page(sort_column, descending, offset, page_size)
+
+    st.dataframe(page_rows, height=TABLE_HEIGHT, hide_index=True)
+    st.caption(f'rows {min(offset + 1, row_count):,}-{offset + len(page_rows):,} of {row_count:,}')
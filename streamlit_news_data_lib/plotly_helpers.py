@@ -1,3 +1,16 @@
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+import polars as pl
+
+# the defaults of plotly express, the figures keep their look
+DISCRETE_COLORS = px.colors.qualitative.Plotly
+CONTINUOUS_COLOR_SCALE = px.colors.sequential.Plasma
+
+# scatter traces with more points are rendered with webgl (as plotly express does)
+WEBGL_MIN_POINTS = 1000
+
+
 def add_horizontal_line(fig, x0, x1, y_axis_intercept):
     fig.add_shape(
         type='line',
@@ -11,3 +24,136 @@ def add_horizontal_line(fig, x0, x1, y_axis_intercept):
             dash='dash'
         )
     )
+
+
+def add_percentile_band(fig, x, lower, upper, name='25th-75th percentile'):
+    fig.add_scatter(
+        x=column_values(x),
+        y=column_values(upper),
+        mode='lines',
+        line=dict(width=0),
+        showlegend=False,
+        hoverinfo='skip'
+    )
+    fig.add_scatter(
+        x=column_values(x),
+        y=column_values(lower),
+        mode='lines',
+        line=dict(width=0),
+        fill='tonexty',
+        fillcolor='rgba(99, 110, 250, 0.2)',
+        name=name,
+        hoverinfo='skip'
+    )
+
+
+def column_values(column: pl.Series) -> np.ndarray:
+    """
+    numpy array over the column's arrow buffer, without a round trip through pandas.
+    numeric columns without nulls are not copied, categorical columns are returned as their string values.
+    plotly serializes numeric numpy arrays as typed binary arrays, float32 / int32 columns stay half the size.
+    """
+    if column.dtype == pl.Categorical:
+        column = column.cast(pl.String)
+    elif column.dtype == pl.Date:
+        # numpy dates are serialized with a time of day
+        column = column.dt.to_string('%Y-%m-%d')
+    return column.to_numpy()
+
+
+def _split_by_color(df: pl.DataFrame, color: str | None):
+    if color is None:
+        return [(None, df)]
+    return [(str(name), group) for (name,), group in df.group_by(color, maintain_order=True)]
+
+
+def _hover_template(x: str, y: str, hover_columns: dict[str, str], custom_columns: list[str]):
+    """
+    :param hover_columns: column -> d3 format (e.g. ':.2f', or '' for the default format)
+    """
+    lines = [
+        f"{x}=%{{x{hover_columns.get(x, '')}}}",
+        f"{y}=%{{y{hover_columns.get(y, '')}}}",
+    ] + [
+        f'{column}=%{{customdata[{i}]{hover_columns[column]}}}'
+        for i, column in enumerate(custom_columns)
+    ]
+    return '<br>'.join(lines) + '<extra></extra>'
+
+
+def columnar_scatter(
+        df: pl.DataFrame,
+        x: str,
+        y: str,
+        title: str,
+        color: str | None = None,
+        hover_columns: dict[str, str] | None = None
+) -> go.Figure:
+    """
+    scatter plot built straight from the frame's columns, in place of px.scatter.
+    :param color: discrete (a trace per value) or numeric (continuous color scale) column
+    :param hover_columns: column -> d3 format (e.g. ':.2f', or '' for the default format), shown on hover
+    """
+    hover_columns = hover_columns or {}
+    custom_columns = [column for column in hover_columns if column not in (x, y)]
+    continuous_color = color is not None and df[color].dtype.is_numeric()
+    trace_type = go.Scattergl if len(df) > WEBGL_MIN_POINTS else go.Scatter
+
+    fig = go.Figure()
+
+    for i, (name, group) in enumerate(_split_by_color(df, None if continuous_color else color)):
+        if continuous_color:
+            marker = dict(color=column_values(group[color]), coloraxis='coloraxis')
+        else:
+            marker = dict(color=DISCRETE_COLORS[i % len(DISCRETE_COLORS)])
+
+        fig.add_trace(trace_type(
+            x=column_values(group[x]),
+            y=column_values(group[y]),
+            mode='markers',
+            name=name,
+            legendgroup=name,
+            showlegend=name is not None,
+            marker=marker,
+            customdata=np.column_stack([column_values(group[c]) for c in custom_columns]) if custom_columns else None,
+            hovertemplate=_hover_template(x, y, hover_columns, custom_columns)
+        ))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title=x,
+        yaxis_title=y,
+        legend_title_text=None if continuous_color else color,
+    )
+    if continuous_color:
+        fig.update_layout(coloraxis=dict(colorscale=CONTINUOUS_COLOR_SCALE, colorbar=dict(title=color)))
+
+    return fig
+
+
+def columnar_bar(df: pl.DataFrame, x: str, y: str, title: str, color: str | None = None) -> go.Figure:
+    """
+    bar plot built straight from the frame's columns, in place of px.bar.
+    :param color: discrete column, bars of the same x are stacked
+    """
+    fig = go.Figure()
+
+    for i, (name, group) in enumerate(_split_by_color(df, color)):
+        fig.add_trace(go.Bar(
+            x=column_values(group[x]),
+            y=column_values(group[y]),
+            name=name,
+            showlegend=name is not None,
+            marker=dict(color=DISCRETE_COLORS[i % len(DISCRETE_COLORS)]),
+            hovertemplate=_hover_template(x, y, {}, [])
+        ))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title=x,
+        yaxis_title=y,
+        legend_title_text=color,
+        barmode='relative'
+    )
+
+    return fig
@@ -0,0 +1,54 @@
+"""
+progressive rendering of heavy charts.
+
+on a cold cache, the retriever is first run over a small random sample of the articles and the approximate chart
+is drawn right away with an "approximate" badge. the page then computes the exact result and replaces the chart.
+streamlit sends elements to the browser as the script runs, so the approximate charts are visible while the
+exact queries are still running.
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
+import plotly.graph_objects as go
+import polars as pl
+import streamlit as st
+
+from streamlit_news_data_lib.snapshots import has_snapshot
+
+APPROXIMATE_SAMPLE_PERCENT = 5
+
+
+@dataclass
+class ProgressiveChart:
+    # cached retriever (see frame_cache.py) accepting a sample_percent keyword argument
+    retriever: Callable[..., pl.DataFrame]
+    args: tuple
+    build_figure: Callable[[pl.DataFrame], go.Figure]
+    placeholder: st.delta_generator.DeltaGenerator
+    # key of the chart's (or its result's) static snapshot (see snapshots.py), None if the chart is not a default view
+    snapshot_key: str | None = None
+
+    def is_cached(self) -> bool:
+        return (
+            has_snapshot(self.snapshot_key)
+            or has_snapshot(self.snapshot_key, 'parquet')
+            or self.retriever.is_cached(*self.args)
+        )
+
+
+def render_approximations(charts: list[ProgressiveChart], sample_percent: float = APPROXIMATE_SAMPLE_PERCENT):
+    """
+    draws approximate versions of the charts whose exact result is neither cached nor snapshotted yet.
+    all approximations are drawn before any exact result is computed.
+    the caller replaces the placeholders' content with the exact charts afterward.
+    """
+    for chart in charts:
+        if chart.is_cached():
+            continue
+
+        approximate_result = chart.retriever(*chart.args, sample_percent=sample_percent)
+
+        with chart.placeholder.container():
+            st.caption(f':orange-badge[approximate] {sample_percent}% sample of articles, exact results are loading')
+            st.plotly_chart(chart.build_figure(approximate_result))
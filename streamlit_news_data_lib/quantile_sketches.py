@@ -0,0 +1,138 @@
+"""
+mergeable quantile sketches (t-digest).
+
+a sketch is a sorted list of centroids (mean, weight). sketches are merged by concatenating their centroids and
+compressing the result, so per (symbol, day) sketches answer medians and arbitrary percentiles for any period and
+any set of symbols without re-sorting the raw rows. groups with at most `compression` values keep every value
+as a centroid of weight 1, so their quantiles are exact.
+"""
+
+import numpy as np
+import polars as pl
+
+DEFAULT_COMPRESSION = 100
+
+
+def compress_centroids(
+        means: np.ndarray,
+        weights: np.ndarray,
+        compression: int = DEFAULT_COMPRESSION
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    merges neighbouring centroids using the k1 scale function of t-digest (arcsin),
+    which keeps centroids small near the tails. results in about compression / 2 centroids.
+    """
+    order = np.argsort(means, kind='stable')
+    means, weights = means[order], weights[order]
+
+    if len(means) <= compression:
+        return means, weights
+
+    q = (np.cumsum(weights) - weights / 2) / weights.sum()
+    k = compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+    bins = np.floor(k - k[0]).astype(np.int64)
+
+    merged_weights = np.bincount(bins, weights=weights)
+    keep = merged_weights > 0
+    merged_means = np.bincount(bins, weights=weights * means)[keep] / merged_weights[keep]
+
+    return merged_means, merged_weights[keep]
+
+
+def centroid_quantiles(means: np.ndarray, weights: np.ndarray, quantiles: list[float]) -> np.ndarray:
+    """
+    :param means: sorted centroid means
+    :param quantiles: in [0, 1]
+    """
+    if len(means) == 0:
+        return np.full(len(quantiles), np.nan)
+
+    centers = np.cumsum(weights) - weights / 2
+    return np.interp(np.asarray(quantiles) * weights.sum(), centers, means)
+
+
+def build_sketches(
+        group_sizes: np.ndarray,
+        sorted_values: np.ndarray,
+        compression: int = DEFAULT_COMPRESSION
+) -> tuple[pl.Series, pl.Series]:
+    """
+    compresses the values of all groups at once, the same as compress_centroids with weights of 1 per group.
+    :param group_sizes: number of values of each group, all > 0
+    :param sorted_values: the values of all groups, group after group, sorted within each group
+    :return: list columns of the centroid means and centroid weights of each group
+    """
+    group_sizes = np.asarray(group_sizes, dtype=np.int64)
+    sorted_values = np.asarray(sorted_values, dtype=np.float64)
+    group_starts = np.cumsum(group_sizes) - group_sizes
+    value_groups = np.repeat(np.arange(len(group_sizes)), group_sizes)
+
+    ranks = np.arange(len(sorted_values)) - group_starts[value_groups]
+    sizes = group_sizes[value_groups]
+
+    # k1 scale function relative to the first value of the group, see compress_centroids
+    k_scale = compression / (2 * np.pi)
+    k = k_scale * np.arcsin(2 * (ranks + 0.5) / sizes - 1)
+    k_first = k_scale * np.arcsin(1 / sizes - 1)
+    # small groups keep every value as a centroid
+    bins = np.where(sizes <= compression, ranks, np.floor(k - k_first).astype(np.int64))
+
+    # bins are non decreasing within a group, a centroid starts at each new group or bin
+    centroid_starts = np.ones(len(sorted_values), dtype=bool)
+    centroid_starts[1:] = (value_groups[1:] != value_groups[:-1]) | (bins[1:] != bins[:-1])
+    value_centroids = np.cumsum(centroid_starts) - 1
+
+    centroid_weights = np.bincount(value_centroids).astype(np.float64)
+    centroid_means = np.bincount(value_centroids, weights=sorted_values) / centroid_weights
+
+    centroids = pl.DataFrame({
+        'group': value_groups[centroid_starts],
+        'centroid_means': centroid_means,
+        'centroid_weights': centroid_weights,
+    }).group_by('group', maintain_order=True).agg('centroid_means', 'centroid_weights')
+
+    return centroids['centroid_means'], centroids['centroid_weights']
+
+
+def merge_sketches(
+        sketches: pl.DataFrame,
+        by: list[str],
+        percentiles: list[float],
+        compression: int = DEFAULT_COMPRESSION
+) -> pl.DataFrame:
+    """
+    :param sketches: frame with the columns in `by` and count, sum, centroid_means, centroid_weights
+    :param percentiles: in [0, 100]
+    :return: frame with the columns in `by`, count, mean and a column per percentile (e.g. p50)
+    """
+    merged = (
+        sketches
+        .group_by(by)
+        .agg(
+            pl.col('count').sum(),
+            pl.col('sum').sum(),
+            pl.col('centroid_means').flatten(),
+            pl.col('centroid_weights').flatten()
+        )
+        .sort(by)
+    )
+
+    quantiles = [p / 100 for p in percentiles]
+    percentile_values = np.array([
+        centroid_quantiles(
+            *compress_centroids(np.asarray(means, dtype=np.float64), np.asarray(weights, dtype=np.float64),
+                                compression),
+            quantiles
+        )
+        for means, weights in zip(merged['centroid_means'].to_list(), merged['centroid_weights'].to_list())
+    ]).reshape(len(merged), len(percentiles))
+
+    return merged.select(
+        *by,
+        'count',
+        (pl.col('sum') / pl.col('count')).alias('mean'),
+        *[
+            pl.Series(f'p{p:g}', percentile_values[:, i])
+            for i, p in enumerate(percentiles)
+        ]
+    )
@@ -0,0 +1,337 @@
+"""
+static snapshots of the default views of both pages.
+
+the renderer reuses the retrievers and the figure code of the pages to render every default chart of the market
+overview, and the charts of the top-N symbols x periods of the individual stock viewer, to plotly json (served by
+the app) and html files, in parallel worker processes. the first page and row count of the stock viewer's ohlcv
+table are saved as parquet files, so a default stock viewer view runs no query at all. so is the result of the
+market overview's similarity scatter, which the page filters by the slider range.
+a manifest records the data version each snapshot was rendered from, so a rerun only re-renders the views whose
+source data changed since. run it after each data sync:
+
+    python -m streamlit_news_data_lib.snapshots --output-dir snapshots --top-n 20 --workers 4
+
+the app serves a snapshot instead of querying the database when the env variable snapshot_directory is set and a
+snapshot of the requested view exists.
+"""
+
+import argparse
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from os import environ, makedirs, path, replace
+from typing import Callable
+
+import duckdb
+import plotly.graph_objects as go
+import plotly.io
+import polars as pl
+
+from streamlit_news_data_lib.duckdb_retrievers import (
+    DuckDatePartSpecifier,
+    SymbolSortOption,
+    get_avg_sentiment_per_day,
+    get_avg_sentiment_per_period_for_symbol,
+    get_data_versions,
+    get_list_of_symbols,
+    get_most_similar_with_returns,
+    get_motherduck_conn,
+    get_ohlcv_data,
+    get_ohlcv_page,
+    get_ohlcv_row_count,
+    get_publish_count_per_day,
+    get_publish_freq_per_period_for_symbol,
+    get_sentiment_day_return_pairs,
+    get_symbol_data_versions,
+    get_symbol_mentions_per_period,
+)
+from streamlit_news_data_lib.figures import (
+    SYMBOL_MENTIONS_STEP,
+    build_avg_sentiment_per_day_plot,
+    build_publish_count_per_day_plot,
+    build_sentiment_day_return_pairs_plot,
+    build_symbol_avg_sentiment_per_period_plot,
+    build_symbol_freq_per_period_plot,
+    build_symbol_mentions_per_period_plot,
+    build_symbol_ohlc_plot,
+)
+from streamlit_news_data_lib.frame_cache import default_frame_cache
+from streamlit_news_data_lib.paginated_table import PAGE_SIZES
+
+# bump when the figure code changes, so all snapshots are re-rendered
+SNAPSHOT_FORMAT_VERSION = 2
+
+MANIFEST_FILE_NAME = 'manifest.json'
+
+MARKET_OVERVIEW_PAGE = 'market_overview'
+INDIVIDUAL_STOCK_VIEWER_PAGE = 'individual_stock_viewer'
+
+PERIODS = [d.name.lower() for d in DuckDatePartSpecifier]
+
+# (sort column, descending, offset, limit) of the default page of the stock viewer's ohlcv table
+OHLCV_SNAPSHOT_PAGE = ('timestamp', False, 0, PAGE_SIZES[0])
+
+# used by two views of each (symbol, period)
+get_avg_sentiment_per_period_for_symbol = default_frame_cache.cached(get_avg_sentiment_per_period_for_symbol)
+
+
+def snapshot_key(page: str, view: str, **params) -> str:
+    return '/'.join([page, view] + [f'{name}={value}' for name, value in sorted(params.items())])
+
+
+def get_snapshot_directory() -> str | None:
+    return environ.get('snapshot_directory')
+
+
+def _snapshot_path(directory: str, key: str, extension: str) -> str:
+    return path.join(directory, f'{key}.{extension}')
+
+
+def has_snapshot(key: str | None, extension: str = 'json') -> bool:
+    directory = get_snapshot_directory()
+    return directory is not None and key is not None and path.exists(_snapshot_path(directory, key, extension))
+
+
+def load_snapshot(key: str | None) -> go.Figure | None:
+    if not has_snapshot(key):
+        return None
+    return plotly.io.read_json(_snapshot_path(get_snapshot_directory(), key, 'json'))
+
+
+def load_frame_snapshot(key: str | None) -> pl.DataFrame | None:
+    if not has_snapshot(key, 'parquet'):
+        return None
+    return pl.read_parquet(_snapshot_path(get_snapshot_directory(), key, 'parquet'))
+
+
+def snapshot_or_render(key: str | None, render: Callable[[], go.Figure]) -> go.Figure:
+    """
+    :param key: None for non default views (never snapshotted)
+    :param render: builds the figure from the database when there is no snapshot
+    """
+    snapshot = load_snapshot(key)
+    return snapshot if snapshot is not None else render()
+
+
+def render_symbol_ohlc(_md_conn: duckdb.DuckDBPyConnection, symbol: str, period: str, dedupe: bool = False):
+    symbol_avg_sentiment_per_period = get_avg_sentiment_per_period_for_symbol(_md_conn, period, symbol, dedupe)
+
+    symbol_ohlc = get_ohlcv_data(
+        _md_conn,
+        symbol,
+        period,
+        symbol_avg_sentiment_per_period['timestamp'].min(),
+        symbol_avg_sentiment_per_period['timestamp'].max()
+    )
+
+    return build_symbol_ohlc_plot(symbol_avg_sentiment_per_period, symbol_ohlc, symbol, period)
+
+
+def get_symbol_timestamp_range(_md_conn: duckdb.DuckDBPyConnection, symbol: str, period: str, dedupe: bool = False):
+    """
+    :return: first and last period with articles of the symbol, the range of the stock viewer's ohlcv bars
+    """
+    symbol_avg_sentiment_per_period = get_avg_sentiment_per_period_for_symbol(_md_conn, period, symbol, dedupe)
+    return symbol_avg_sentiment_per_period['timestamp'].min(), symbol_avg_sentiment_per_period['timestamp'].max()
+
+
+def render_ohlcv_first_page(_md_conn: duckdb.DuckDBPyConnection, symbol: str, period: str):
+    return get_ohlcv_page(
+        _md_conn, symbol, period, *get_symbol_timestamp_range(_md_conn, symbol, period), *OHLCV_SNAPSHOT_PAGE
+    )
+
+
+def render_ohlcv_row_count(_md_conn: duckdb.DuckDBPyConnection, symbol: str, period: str):
+    row_count = get_ohlcv_row_count(_md_conn, symbol, period, *get_symbol_timestamp_range(_md_conn, symbol, period))
+    return pl.DataFrame({'row_count': [row_count]})
+
+
+# view -> function rendering the figure (or the table frame) of the view's default state from the database
+VIEW_RENDERERS: dict[str, Callable[..., go.Figure | pl.DataFrame]] = {
+    'publish_count_per_day': lambda conn: build_publish_count_per_day_plot(
+        get_publish_count_per_day(conn)
+    ),
+    'symbol_mentions_per_period': lambda conn, period, offset: build_symbol_mentions_per_period_plot(
+        get_symbol_mentions_per_period(conn, period, offset * SYMBOL_MENTIONS_STEP, limit=SYMBOL_MENTIONS_STEP),
+        period
+    ),
+    'avg_sentiment_per_day': lambda conn: build_avg_sentiment_per_day_plot(
+        get_avg_sentiment_per_day(conn)
+    ),
+    'sentiment_day_return_pairs': lambda conn: build_sentiment_day_return_pairs_plot(
+        get_sentiment_day_return_pairs(conn)
+    ),
+    # unfiltered, the page applies the slider range to it
+    'most_similar_with_returns': lambda conn: get_most_similar_with_returns(conn),
+    'symbol_freq_per_period': lambda conn, symbol, period: build_symbol_freq_per_period_plot(
+        get_publish_freq_per_period_for_symbol(conn, period, symbol),
+        symbol,
+        period
+    ),
+    'symbol_avg_sentiment_per_period': lambda conn, symbol, period: build_symbol_avg_sentiment_per_period_plot(
+        get_avg_sentiment_per_period_for_symbol(conn, period, symbol),
+        symbol,
+        period
+    ),
+    'symbol_ohlc': render_symbol_ohlc,
+    'ohlcv_first_page': render_ohlcv_first_page,
+    'ohlcv_row_count': render_ohlcv_row_count,
+}
+
+
+@dataclass
+class SnapshotView:
+    page: str
+    view: str
+    params: dict
+    # fingerprint of the data the view is rendered from
+    data_version: str
+
+    @property
+    def key(self):
+        return snapshot_key(self.page, self.view, **self.params)
+
+
+def list_default_views(_md_conn: duckdb.DuckDBPyConnection, top_n: int) -> list[SnapshotView]:
+    """
+    the market overview's views (the similarity scatter's unfiltered result), and the stock viewer's views of the
+    union of the top-N symbols by number of articles and by the default sort option.
+    """
+    data_versions = get_data_versions(_md_conn)
+    articles_version = f"{SNAPSHOT_FORMAT_VERSION}:{data_versions['articles']}"
+    articles_ohlc_version = f"{articles_version}:{data_versions['ohlc']}"
+
+    views = [
+        SnapshotView(MARKET_OVERVIEW_PAGE, 'publish_count_per_day', {}, articles_version),
+        SnapshotView(MARKET_OVERVIEW_PAGE, 'avg_sentiment_per_day', {}, articles_version),
+        SnapshotView(MARKET_OVERVIEW_PAGE, 'sentiment_day_return_pairs', {}, articles_ohlc_version),
+        SnapshotView(MARKET_OVERVIEW_PAGE, 'most_similar_with_returns', {}, articles_ohlc_version),
+    ]
+    views += [
+        SnapshotView(MARKET_OVERVIEW_PAGE, 'symbol_mentions_per_period', {'period': period, 'offset': 0},
+                     articles_version)
+        for period in PERIODS
+    ]
+
+    top_symbols = list(dict.fromkeys(
+        get_list_of_symbols(_md_conn, SymbolSortOption.NUMBER_OF_ARTICLES.name)[:top_n]
+        + get_list_of_symbols(_md_conn, list(SymbolSortOption)[0].name)[:top_n]
+    ))
+
+    symbol_versions = {
+        row['symbol']: row
+        for row in get_symbol_data_versions(_md_conn).iter_rows(named=True)
+    }
+
+    for symbol in top_symbols:
+        symbol_version = symbol_versions.get(symbol, {'articles_version': '', 'ohlc_version': ''})
+        symbol_articles_version = f"{SNAPSHOT_FORMAT_VERSION}:{symbol_version['articles_version']}"
+        symbol_articles_ohlc_version = f"{symbol_articles_version}:{symbol_version['ohlc_version']}"
+
+        for period in PERIODS:
+            params = {'symbol': symbol, 'period': period}
+            views += [
+                SnapshotView(INDIVIDUAL_STOCK_VIEWER_PAGE, 'symbol_freq_per_period', params, symbol_articles_version),
+                SnapshotView(INDIVIDUAL_STOCK_VIEWER_PAGE, 'symbol_avg_sentiment_per_period', params,
+                             symbol_articles_version),
+                SnapshotView(INDIVIDUAL_STOCK_VIEWER_PAGE, 'symbol_ohlc', params, symbol_articles_ohlc_version),
+                SnapshotView(INDIVIDUAL_STOCK_VIEWER_PAGE, 'ohlcv_first_page', params, symbol_articles_ohlc_version),
+                SnapshotView(INDIVIDUAL_STOCK_VIEWER_PAGE, 'ohlcv_row_count', params, symbol_articles_ohlc_version),
+            ]
+
+    return views
+
+
+_worker_conn: duckdb.DuckDBPyConnection | None = None
+
+
+def _init_worker():
+    global _worker_conn
+    _worker_conn = get_motherduck_conn()
+
+
+def _render_view(view: SnapshotView, output_dir: str) -> SnapshotView:
+    fig = VIEW_RENDERERS[view.view](_worker_conn, **view.params)
+
+    makedirs(path.dirname(_snapshot_path(output_dir, view.key, 'json')), exist_ok=True)
+
+    # written to a temp file and renamed, so the app never reads a partially written snapshot
+    if isinstance(fig, pl.DataFrame):
+        table_path = _snapshot_path(output_dir, view.key, 'parquet')
+        fig.write_parquet(f'{table_path}.tmp')
+        replace(f'{table_path}.tmp', table_path)
+        return view
+
+    json_path = _snapshot_path(output_dir, view.key, 'json')
+    with open(f'{json_path}.tmp', 'w') as f:
+        f.write(plotly.io.to_json(fig))
+    replace(f'{json_path}.tmp', json_path)
+
+    fig.write_html(_snapshot_path(output_dir, view.key, 'html'), include_plotlyjs='cdn')
+
+    return view
+
+
+def render_snapshots(output_dir: str, top_n: int, workers: int, force: bool = False):
+    """
+    views which fail to render are logged and left out of the manifest (so the next run retries them), the other
+    views are still rendered.
+    :param force: re-render all views, even the ones whose data did not change
+    :return: number of rendered views
+    """
+    makedirs(output_dir, exist_ok=True)
+    manifest_path = path.join(output_dir, MANIFEST_FILE_NAME)
+
+    manifest = {}
+    if path.exists(manifest_path) and not force:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    views = list_default_views(get_motherduck_conn(), top_n)
+    changed_views = [view for view in views if manifest.get(view.key) != view.data_version]
+
+    print(f'rendering {len(changed_views)} of {len(views)} views')
+
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            mp_context=multiprocessing.get_context('spawn')
+    ) as executor:
+        futures = {executor.submit(_render_view, view, output_dir): view for view in changed_views}
+
+        rendered = 0
+        for i, future in enumerate(as_completed(futures)):
+            view = futures[future]
+
+            try:
+                future.result()
+            except Exception as e:
+                print(f'failed to render {view.key}: {type(e).__name__}: {e}')
+            else:
+                manifest[view.key] = view.data_version
+                rendered += 1
+
+            # saved along the way, so an interrupted run does not re-render finished views
+            if i % 20 == 0 or i == len(changed_views) - 1:
+                with open(manifest_path, 'w') as f:
+                    json.dump(manifest, f, indent=2, sort_keys=True)
+
+    print(f'rendered {rendered} views, {len(changed_views) - rendered} failed')
+
+    return rendered
+
+
+def main():
+    parser = argparse.ArgumentParser(description='render static snapshots of the default views of both pages')
+    parser.add_argument('--output-dir', default=get_snapshot_directory() or 'snapshots')
+    parser.add_argument('--top-n', type=int, default=20, help='number of symbols to render the stock viewer for')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--force', action='store_true', help='re-render all views')
+    args = parser.parse_args()
+
+    render_snapshots(args.output_dir, args.top_n, args.workers, args.force)
+
+
+if __name__ == '__main__':
+    main()
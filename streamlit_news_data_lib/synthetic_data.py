@@ -0,0 +1,151 @@
+"""
+builds a local duckdb database with the same tables (and json layout) as the motherduck database,
+filled with random data. used for load testing and local development without a motherduck token.
+"""
+
+import argparse
+
+import duckdb
+
+DEFAULT_SYMBOLS = [
+    'AAPL', 'MSFT', 'NVDA', 'AMZN', 'GOOGL', 'META', 'TSLA', 'AMD', 'INTC', 'NFLX',
+    'JPM', 'BAC', 'XOM', 'CVX', 'PFE', 'MRK', 'KO', 'PEP', 'WMT', 'DIS',
+]
+
+
+def build_synthetic_database(
+        path: str,
+        n_articles: int = 20_000,
+        n_symbols: int = 20,
+        n_days: int = 90,
+        duplicate_share: float = 0.2,
+        start_date: str = '2024-01-02',
+        seed: float = 0.42
+):
+    """
+    :param path: duckdb database file to (re)create
+    :param duplicate_share: share of articles which are near-duplicate (syndicated) copies of another article
+    """
+    symbols = (DEFAULT_SYMBOLS * (n_symbols // len(DEFAULT_SYMBOLS) + 1))[:n_symbols]
+    symbols = [s if i < len(DEFAULT_SYMBOLS) else f'{s}{i}' for i, s in enumerate(symbols)]
+
+    conn = duckdb.connect(path)
+    conn.execute(f"SELECT setseed({seed})")
+
+    conn.execute("CREATE OR REPLACE TABLE symbols_list AS SELECT unnest($symbols) AS symbol", {'symbols': symbols})
+
+    conn.execute(
+        """
+        CREATE OR REPLACE TABLE clean_symbols AS
+        SELECT symbol FROM symbols_list"""
+    )
+
+    conn.execute(
+        f"""
+        CREATE OR REPLACE TEMP TABLE base_articles AS
+        SELECT
+          i,
+          md5(i::VARCHAR) AS _id,
+          '{start_date}'::TIMESTAMP + to_seconds((random() * {n_days} * 86400)::BIGINT) AS publish_time_NY,
+          (SELECT list(symbol) FROM symbols_list)[1 + (random() ** 2 * {n_symbols})::INT % {n_symbols}] AS symbol,
+          CASE WHEN random() < 0.95 THEN 'en' ELSE 'de' END AS article_language,
+          (random() * 200 - 100)::INT AS sentiment_score,
+          round(random(), 2) AS sentiment_confidence,
+          list_transform(range(256), x -> random() - 0.5) AS embeddings
+        FROM range({n_articles}) t(i)"""
+    )
+
+    # syndicated copies: same story published again shortly after, with a slightly perturbed summary embedding
+    conn.execute(
+        f"""
+        INSERT INTO base_articles
+        SELECT
+          {n_articles} + row_number() OVER () AS i,
+          md5(({n_articles} + row_number() OVER ())::VARCHAR) AS _id,
+          publish_time_NY + to_seconds((random() * 3600)::BIGINT),
+          symbol,
+          article_language,
+          sentiment_score,
+          sentiment_confidence,
+          list_transform(embeddings, x -> x + (random() - 0.5) * 0.02)
+        FROM base_articles
+        USING SAMPLE {duplicate_share * 100}% (bernoulli)"""
+    )
+
+    conn.execute(
+        """
+        CREATE OR REPLACE TABLE llm_feature_extract_date_ny AS
+        SELECT
+          _id,
+          'https://news.example.com/' || _id AS url,
+          publish_time_NY,
+          article_language,
+          json_array(json_object(
+            'symbol', json_object(
+              'symbol', symbol,
+              'stock_exchanges', json_array(CASE WHEN i % 3 = 0 THEN 'NYSE' ELSE 'NASDAQ' END)
+            )
+          )) AS financial_event_with_symbols,
+          json_array(json_object(
+            'sentiment_score', sentiment_score,
+            'sentiment_confidence', sentiment_confidence
+          )) AS sentiments,
+          'summary of article ' || i AS summary,
+          embeddings::FLOAT[] AS summary_embeddings
+        FROM base_articles
+        ORDER BY publish_time_NY"""
+    )
+
+    conn.execute(
+        """
+        CREATE OR REPLACE VIEW llm_feature_extract AS
+        SELECT * FROM llm_feature_extract_date_ny"""
+    )
+
+    # regular trading hours only, random walk per symbol
+    conn.execute(
+        f"""
+        CREATE OR REPLACE TABLE minute_ohlc_ny_tz AS
+        WITH minutes AS (
+          SELECT
+            symbol,
+            day + INTERVAL '9 hours 30 minutes' + to_minutes(minute) AS timestamp_ny,
+            exp(sum(random() * 0.002 - 0.001) OVER (
+              PARTITION BY symbol
+              ORDER BY day, minute
+            )) * 100 AS price
+          FROM symbols_list,
+            range('{start_date}'::TIMESTAMP, '{start_date}'::TIMESTAMP + INTERVAL {n_days + 2} DAYS, INTERVAL 1 DAY)
+              t(day),
+            range(390) m(minute)
+          WHERE dayofweek(day) BETWEEN 1 AND 5
+        )
+        SELECT
+          symbol,
+          timestamp_ny,
+          price AS open,
+          price * (1 + random() * 0.001) AS high,
+          price * (1 - random() * 0.001) AS low,
+          price * (1 + random() * 0.001 - 0.0005) AS close,
+          (random() * 10000)::BIGINT AS volume
+        FROM minutes
+        ORDER BY symbol, timestamp_ny"""
+    )
+
+    conn.execute("DROP TABLE symbols_list")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path')
+    parser.add_argument('--articles', type=int, default=20_000)
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--days', type=int, default=90)
+    args = parser.parse_args()
+
+    build_synthetic_database(args.path, args.articles, args.symbols, args.days)
+
+
+if __name__ == '__main__':
+    main()